@@ -0,0 +1,210 @@
+# Offline benchmark for ytdlpgui: a local stand-in media server, no internet needed
+# Usage: python benchmark.py [--sizes 10,1000,10000] [--output bench_results.json] [--baseline old.json]
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+import subprocess
+import http.server
+import urllib.request
+from datetime import datetime
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, script_dir)
+import ytdlpgui as app
+from yt_dlp.version import __version__ as yt_dlp_version
+
+# --- Stand-in Media Server ---
+# Also used by the tests (tests/conftest.py)
+STORE_FILES = ("HISTORY_FILE", "HISTORY_DB", "METADATA_CACHE_DB", "JOB_QUEUE_DB", "LOG_FILE")
+SAMPLE_VTT = b"WEBVTT\n\n00:00:00.000 --> 00:00:01.000\nHello\n"
+
+def isolated_stores(tmp_dir):
+    # Store path per app global, so a run never touches the user's history, cache or job queue
+    return {name: os.path.join(tmp_dir, os.path.basename(getattr(app, name))) for name in STORE_FILES}
+
+class MediaHandler(http.server.BaseHTTPRequestHandler):
+    # /feed<N>.xml is an RSS playlist of N direct links, /media/<name>.mp4|.m4a a synthetic payload, /media/<name>.vtt a one-cue subtitle
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self): self.respond(head=True)
+    def do_GET(self): self.respond()
+
+    def respond(self, head=False):
+        feed = re.fullmatch(r"/feed(\d+)\.xml", self.path)
+        if feed: body, content_type = self.server.feed(int(feed.group(1))), "application/rss+xml"
+        elif re.fullmatch(r"/media/[\w-]+\.(mp4|m4a)", self.path): body, content_type = self.server.media, "video/mp4"
+        elif re.fullmatch(r"/media/[\w-]+\.vtt", self.path): body, content_type = SAMPLE_VTT, "text/vtt"
+        else: return self.send_error(404)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type); self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head: self.wfile.write(body)
+
+    def log_message(self, *args): pass
+
+class MediaServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, media_size):
+        super().__init__(("127.0.0.1", 0), MediaHandler)
+        self.media, self.feeds = os.urandom(media_size), {}
+        self.base_url = f"http://127.0.0.1:{self.server_address[1]}"
+
+    def feed(self, count):
+        if count not in self.feeds:
+            items = "".join(f"<item><title>Clip {i}</title><link>{self.base_url}/media/v{i}.mp4</link><guid>v{i}</guid></item>" for i in range(count))
+            self.feeds[count] = f'<?xml version="1.0"?><rss version="2.0"><channel><title>Bench Feed {count}</title><link>{self.base_url}/</link>{items}</channel></rss>'.encode("utf-8")
+        return self.feeds[count]
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    value = func(*args, **kwargs)
+    return time.perf_counter() - start, value
+
+# --- Benchmarks ---
+def bench_analysis(server, sizes):
+    results = {}
+    for count in sizes:
+        url, entries = f"{server.base_url}/feed{count}.xml", []
+        cold, _ = timed(app.analyze_url, url, 0, True, lambda batch, *meta: entries.extend(batch))
+        found, entries = len(entries), []
+        warm, _ = timed(app.analyze_url, url, 0, False, lambda batch, *meta: entries.extend(batch))
+        results[str(count)] = {"entries": found, "cold_s": round(cold, 4), "cached_s": round(warm, 4),
+                               "cold_items_per_sec": round(found / cold, 1) if cold else None}
+        print(f"analysis {count:>6}: cold {cold:.3f}s, cached {warm:.3f}s ({found} entries)")
+    return results
+
+def bench_preview(sizes):
+    # Needs a display; the Treeview is built exactly like the GUI's but never shown
+    try: root = app.tk.Tk()
+    except app.tk.TclError as e: return {"skipped": f"no display ({e})"}
+    root.withdraw()
+    app.root, app.preview_scrollbar = root, app.ttk.Scrollbar(root)
+    app.preview_tree = app.ttk.Treeview(root, columns=("check", "url", "title", "duration", "last_download", "progress"), show="headings", height=app.view_rows)
+    app.preview_tree.pack()
+    results = {}
+    for count in sizes:
+        app.clear_preview()
+        entries = [(i, {"id": f"v{i}", "title": f"Clip {i}", "duration": i % 3600, "webpage_url": f"http://127.0.0.1/media/v{i}.mp4", "playlist_index": i})
+                   for i in range(1, count + 1)]
+        def populate():
+            for i in range(0, count, app.ANALYSIS_BATCH_SIZE):
+                app.insert_preview_batch(app.analysis_generation, entries[i:i + app.ANALYSIS_BATCH_SIZE], "playlist_video", "Bench Feed", "Bench")
+            root.update()
+        populate_s, _ = timed(populate)
+        sort_s, _ = timed(app.sort_treeview, "title")
+        results[str(count)] = {"populate_s": round(populate_s, 4), "sort_s": round(sort_s, 4)}
+        print(f"preview  {count:>6}: populate {populate_s:.3f}s, sort {sort_s:.4f}s")
+    root.destroy()
+    return results
+
+def bench_download(server, tmp_dir, item_count, workers):
+    url = f"{server.base_url}/feed{item_count}.xml"
+    jobs = app.collect_jobs([url], [])
+    raw, _ = timed(fetch_all, jobs)
+    results = {"items": len(jobs), "payload_bytes": len(server.media), "raw_fetch_s": round(raw, 4)}
+    for parallel in workers:
+        out_dir = tempfile.mkdtemp(dir=tmp_dir)
+        options = app.default_options(download_type="audio", audio_format="mp3", download_path=out_dir, embed_thumbnail=False,
+                                      download_subtitles=False, add_track_number=True, parallel_downloads=parallel, overwrite="replace")
+        wall, job_results = timed(app.run_jobs, jobs, options)
+        done = sum(r["status"] == "done" for r in job_results)
+        results[f"parallel_{parallel}"] = {"wall_s": round(wall, 4), "done": done, "per_item_ms": round(wall / len(jobs) * 1000, 2),
+                                           "overhead_per_item_ms": round((wall - raw / parallel) / len(jobs) * 1000, 2),
+                                           "phases": app.summarize_metrics(job_results)}
+        print(f"download x{parallel}: {wall:.3f}s for {len(jobs)} items ({done} done), {wall / len(jobs) * 1000:.1f} ms/item")
+    return results
+
+def fetch_all(jobs):
+    # Plain HTTP transfer of the same files, the floor the engine's per-item overhead is measured against
+    for job in jobs:
+        with urllib.request.urlopen(job["url"]) as response: response.read()
+
+def bench_ffmpeg(tmp_dir, seconds):
+    if not shutil.which("ffmpeg"): return {"skipped": "ffmpeg not found"}
+    source, target = os.path.join(tmp_dir, "tone.wav"), os.path.join(tmp_dir, "tone.mp3")
+    app.run_ffmpeg(["ffmpeg", "-y", "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}", "-ac", "2", source])
+    encode_s, _ = timed(app.run_ffmpeg, app.mp3_encode_command("ffmpeg", source, None, target, "320 kbps (Best)", "Tone", "Bench"))
+    print(f"ffmpeg mp3: {encode_s:.3f}s for {seconds}s of audio")
+    return {"audio_s": seconds, "mp3_encode_s": round(encode_s, 4), "realtime_factor": round(seconds / encode_s, 1)}
+
+def bench_startup(runs):
+    # Fresh interpreter each time: module import is what stands before the window; yt-dlp loads on first use
+    code = "import time; t = time.perf_counter(); import ytdlpgui; a = time.perf_counter(); ytdlpgui.import_yt_dlp(); print(a - t, time.perf_counter() - a)"
+    imports, yt_dlp_loads, walls = [], [], []
+    for _ in range(runs):
+        wall, output = timed(subprocess.run, [sys.executable, "-c", code], cwd=script_dir, capture_output=True, text=True, check=True)
+        module_s, yt_dlp_s = map(float, output.stdout.strip().splitlines()[-1].split())
+        imports.append(module_s); yt_dlp_loads.append(yt_dlp_s); walls.append(wall)
+    print(f"startup: import {statistics.median(imports):.3f}s, yt-dlp {statistics.median(yt_dlp_loads):.3f}s, process {statistics.median(walls):.3f}s (median of {runs})")
+    return {"runs": runs, "import_s": round(statistics.median(imports), 4), "yt_dlp_load_s": round(statistics.median(yt_dlp_loads), 4),
+            "process_s": round(statistics.median(walls), 4)}
+
+# --- Regression Check ---
+def flatten(results, prefix=""):
+    for key, value in results.items():
+        if isinstance(value, dict): yield from flatten(value, f"{prefix}{key}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and key.endswith(("_s", "_ms")): yield f"{prefix}{key}", value
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, "r", encoding="utf-8") as f: baseline = dict(flatten(json.load(f)["results"]))
+    regressions = []
+    for key, value in flatten(results):
+        old = baseline.get(key)
+        if not old: continue
+        change, noise = (value - old) / old, 5 if key.endswith("_ms") else 0.005
+        marker = "  REGRESSION" if change > threshold and value - old > noise else ""
+        print(f"{key:<45} {old:>10.4f} -> {value:>10.4f} ({change:+.0%}){marker}")
+        if marker: regressions.append(key)
+    return regressions
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Offline ytdlpgui benchmark against a local stand-in media server.")
+    parser.add_argument("--sizes", default="10,1000,10000", help="playlist sizes for the analysis and preview benchmarks")
+    parser.add_argument("--download-items", type=int, default=20)
+    parser.add_argument("--parallel", default="1,4", help="worker counts for the download benchmark")
+    parser.add_argument("--media-kb", type=int, default=64, help="size of each synthetic media file")
+    parser.add_argument("--ffmpeg-seconds", type=int, default=60)
+    parser.add_argument("--startup-runs", type=int, default=5)
+    parser.add_argument("--skip", default="", help="comma-separated: analysis,preview,download,ffmpeg,startup")
+    parser.add_argument("--output", default=os.path.join(script_dir, "bench_results.json"))
+    parser.add_argument("--baseline", help="earlier results file; exits 1 if any timing got slower than --threshold")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--verbose", action="store_true", help="keep the app's log messages")
+    args = parser.parse_args(argv)
+    sizes, skip = [int(s) for s in args.sizes.split(",") if s], set(args.skip.split(","))
+
+    tmp_dir = tempfile.mkdtemp(prefix="ytdlpgui-bench-")
+    for name, path in isolated_stores(tmp_dir).items(): setattr(app, name, path)
+    if not args.verbose: app.log_message = lambda msg: None
+
+    server = MediaServer(args.media_kb * 1024)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    results = {}
+    try:
+        if "analysis" not in skip: results["analysis"] = bench_analysis(server, sizes)
+        if "preview" not in skip: results["preview"] = bench_preview(sizes)
+        if "download" not in skip: results["download"] = bench_download(server, tmp_dir, args.download_items, [int(w) for w in args.parallel.split(",") if w])
+        if "ffmpeg" not in skip: results["ffmpeg"] = bench_ffmpeg(tmp_dir, args.ffmpeg_seconds)
+        if "startup" not in skip: results["startup"] = bench_startup(args.startup_runs)
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    report = {"created": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(), "platform": platform.platform(),
+              "yt_dlp": yt_dlp_version, "results": results}
+    with open(args.output, "w", encoding="utf-8") as f: json.dump(report, f, indent=4)
+    print(f"Results written to {args.output}")
+    if args.baseline and compare(results, args.baseline, args.threshold): return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
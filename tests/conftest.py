@@ -0,0 +1,24 @@
+# Shared fixtures: the benchmark's stand-in media server and isolated app stores
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ytdlpgui as app
+import benchmark
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    for name, path in benchmark.isolated_stores(str(tmp_path)).items(): monkeypatch.setattr(app, name, path)
+    for name in ("history_db", "metadata_db", "queue_db"): monkeypatch.setattr(app, name, None)
+    monkeypatch.setattr(app, "log_message", lambda msg: None)
+    return tmp_path
+
+@pytest.fixture
+def media_server():
+    server = benchmark.MediaServer(32 * 1024)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
@@ -0,0 +1,93 @@
+# Coordinator / worker mode on localhost: the stand-in media server, an in-process coordinator and worker processes
+import os
+import sys
+import json
+import time
+import shutil
+import threading
+import subprocess
+
+import pytest
+
+script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, script_dir)
+import ytdlpgui as app
+
+ITEMS, WORKERS = 12, 3
+
+def queue_jobs(server, download_path):
+    options = app.default_options(download_type="audio", audio_format="mp3", download_path=str(download_path), embed_thumbnail=False,
+                                  download_subtitles=False, overwrite="replace", shared_store=False)
+    return app.enqueue_jobs(app.collect_jobs([f"{server.base_url}/feed{ITEMS}.xml"], []), options)
+
+def test_workers_drain_the_queue(stores, media_server):
+    events, coordinator, workers = [], None, []
+    try:
+        jobs = queue_jobs(media_server, stores / "coordinator")
+        coordinator = app.start_coordinator("127.0.0.1", 0, "secret", lambda kind, **data: events.append((kind, data)))
+        coordinator.add_jobs(jobs)
+        url = f"http://127.0.0.1:{coordinator.server_address[1]}"
+        for i in range(WORKERS):
+            # Each worker is its own copy of the app, with its own config and stores, as on another host
+            folder = stores / f"w{i}"; folder.mkdir()
+            shutil.copy(os.path.join(script_dir, "ytdlpgui.py"), folder)
+            # The first one has its folder in config.json only: it must never fall back to the coordinator's path
+            if i == 0: (folder / "config.json").write_text(json.dumps({"download_path": str(folder / "out")}), encoding="utf-8")
+            path_args = ["--path", str(folder / "out")] if i else []
+            workers.append(subprocess.Popen([sys.executable, "ytdlpgui.py", "--worker", url, "--token", "secret", "--name", f"w{i}", "--parallel", "2",
+                                             *path_args, "--until-drained"], cwd=folder, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        for worker in workers: assert worker.wait(timeout=120) == 0
+    finally:
+        for worker in workers:
+            if worker.poll() is None: worker.kill()
+        if coordinator: coordinator.shutdown()
+
+    status = coordinator.status()
+    assert status["states"] == {"done": ITEMS} and not status["leased"]
+    assert set(app.get_history_many(job["video_id"] for job in jobs)) == {job["video_id"] for job in jobs}
+    completed = [data["message"] for kind, data in events if kind == "log" and "] done: " in data["message"]]
+    assert len(completed) == ITEMS and len(set(message.split("] ")[1] for message in completed)) == ITEMS
+    files = [name for i in range(WORKERS) for _, _, names in os.walk(stores / f"w{i}" / "out") for name in names]
+    assert len(files) == ITEMS and not (stores / "coordinator").exists()
+
+def test_rejects_a_wrong_token(stores):
+    coordinator = app.start_coordinator("127.0.0.1", 0, "secret")
+    try:
+        with pytest.raises(OSError, match="403"):
+            app.coordinator_call(f"http://127.0.0.1:{coordinator.server_address[1]}", "/lease", {"worker": "w", "count": 1}, "wrong")
+    finally:
+        coordinator.shutdown()
+
+def test_expired_lease_goes_to_another_worker(stores, media_server):
+    coordinator = app.Coordinator(("127.0.0.1", 0), on_event=None)
+    try:
+        coordinator.lease_s = 0.2
+        coordinator.add_jobs(queue_jobs(media_server, stores / "out"))
+        leases = [lease["lease"] for lease in coordinator.lease("a", ITEMS)["jobs"]]
+        assert len(leases) == ITEMS and coordinator.lease("b", 1) == {"jobs": [], "drained": False}
+        time.sleep(0.3)
+        assert [lease["lease"] for lease in coordinator.lease("b", ITEMS)["jobs"]] == leases
+        assert not coordinator.complete("a", {"lease": leases[0], "status": "done"})
+        assert all(coordinator.complete("b", {"lease": lease, "status": "done"}) for lease in leases)
+        assert coordinator.lease("a", 1) == {"jobs": [], "drained": True}
+    finally:
+        coordinator.server_close()
+
+def test_concurrent_lease_complete_and_status(stores, media_server):
+    # Lease and complete/status take the coordinator lock and the job queue lock; they must never wait on each other in a cycle
+    coordinator = app.Coordinator(("127.0.0.1", 0))
+    try:
+        coordinator.add_jobs(queue_jobs(media_server, stores / "out"))
+        stop = threading.Event()
+        def leaser(worker):
+            while not stop.is_set():
+                for lease in coordinator.lease(worker, 1)["jobs"]: coordinator.complete(worker, {"lease": lease["lease"], "status": "queued"})
+        def poller():
+            while not stop.is_set(): coordinator.status()
+        threads = [threading.Thread(target=leaser, args=(f"w{i}",), daemon=True) for i in range(3)] + [threading.Thread(target=poller, daemon=True)]
+        for thread in threads: thread.start()
+        time.sleep(1); stop.set()
+        for thread in threads: thread.join(timeout=5)
+        assert not any(thread.is_alive() for thread in threads)
+    finally:
+        coordinator.server_close()
@@ -0,0 +1,60 @@
+# Download engine pieces that need no network: stored-format fallback and per-item output templates
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ytdlpgui as app
+
+class StoredInfoYDL:
+    # process_ie_result() fails with the given cause, extract_info() records the fresh extraction
+    def __init__(self, cause): self.cause, self.extracted = cause, 0
+    def process_ie_result(self, info, download): raise app.DownloadError("failed", exc_info=(type(self.cause), self.cause, None))
+    def extract_info(self, url, download): self.extracted += 1; return {"id": "v1"}
+
+@pytest.fixture
+def stored_info(monkeypatch):
+    app.import_yt_dlp()
+    monkeypatch.setattr(app, "cache_get_info", lambda video_id: {"id": video_id})
+
+@pytest.mark.parametrize("status", [403, 404, 410])
+def test_expired_format_urls_are_re_extracted(stored_info, status):
+    ydl = StoredInfoYDL(SimpleNamespace(status=status))
+    assert app.download_analyzed(ydl, "http://example.invalid/v1", "v1", lambda msg: None) == {"id": "v1"} and ydl.extracted == 1
+
+@pytest.mark.parametrize("cause", [SimpleNamespace(status=500), OSError("No space left on device"), RuntimeError("Postprocessing: Conversion failed!")])
+def test_other_failures_are_not_re_extracted(stored_info, cause):
+    ydl = StoredInfoYDL(cause)
+    with pytest.raises(app.DownloadError): app.download_analyzed(ydl, "http://example.invalid/v1", "v1", lambda msg: None)
+    assert ydl.extracted == 0
+
+def test_every_subtitle_language_is_linked_into_other_playlists(tmp_path):
+    options = app.default_options(download_type="subtitle", download_path=str(tmp_path), add_track_number=True)
+    paths = {}
+    for code in ("en", "ja"):
+        paths[f".{code}.srt"] = str(tmp_path / f"Clip.{code}.srt")
+        with open(paths[f".{code}.srt"], "w", encoding="utf-8") as f: f.write("1\n00:00:00,000 --> 00:00:01,000\nx\n")
+    link = {"content_type": "playlist_video", "playlist_title": "Other", "channel_name": "Chan", "playlist_index": 3}
+    result = {"video_id": "v1", "title": "Clip", "status": "done", "path": paths[".en.srt"], "paths": paths, "links": [link]}
+    app.publish_output({"options": options, "emit": lambda kind, **data: None}, result)
+    assert sorted(os.listdir(tmp_path / "Chan" / "Other")) == ["03 - Clip.en.srt", "03 - Clip.ja.srt"]
+
+@pytest.mark.parametrize("download_type, target_ext", [("video", "mp4"), ("audio", "m4a")])
+def test_split_streams_write_one_subtitle_per_language(tmp_path, media_server, download_type, target_ext):
+    base_url = f"{media_server.base_url}/media"
+    info = {"id": "v1", "title": "T", "webpage_url": f"{base_url}/v1", "extractor": "generic", "extractor_key": "Generic", "_type": "video",
+            "formats": [{"format_id": "137", "url": f"{base_url}/v1.mp4", "ext": "mp4", "height": 240, "vcodec": "avc1.64000d", "acodec": "none", "protocol": "http"},
+                        {"format_id": "140", "url": f"{base_url}/a1.m4a", "ext": "m4a", "vcodec": "none", "acodec": "mp4a.40.2", "protocol": "http"}],
+            "subtitles": {"en": [{"url": f"{base_url}/s1.vtt", "ext": "vtt"}]}}
+    options = app.default_options(download_type=download_type, video_limit="1080p", audio_format=target_ext, embed_thumbnail=False,
+                                  download_subtitles=True, subtitle_language="en", single_pass=True)
+    app.import_yt_dlp()
+    ydl_opts, _ = app.build_ydl_opts(options, {}, target_ext, split_streams=True)
+    with app.YoutubeDL(dict(ydl_opts, postprocessors=[])) as ydl:  # no ffmpeg here: the .vtt is what yt-dlp names
+        app.apply_item_opts(ydl, app.item_ydl_opts(str(tmp_path / "T"), split_streams=True))
+        ydl.process_ie_result(info, download=True)
+    names = sorted(os.listdir(tmp_path))
+    assert [name for name in names if name.endswith(".vtt")] == ["T.en.vtt"]
+    assert any(name.startswith("T.f140.") for name in names)
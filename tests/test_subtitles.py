@@ -0,0 +1,49 @@
+# In-process subtitle conversion (Subtitle Mode): WebVTT and YouTube json3 to SRT
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ytdlpgui as app
+
+def vtt(text):
+    return "".join(app.subtitle_to_srt(text, "vtt"))
+
+def json3(events):
+    return "".join(app.subtitle_to_srt(json.dumps({"events": events}), "json3"))
+
+def test_vtt_header_cue_ids_and_settings():
+    text = "WEBVTT\nKind: captions\nLanguage: en\n\ncue-1\n00:00:01.000 --> 00:00:02.500 align:start position:0%\nHello\n\n00:00:03.000 --> 00:00:04.000\nWorld\n"
+    assert vtt(text) == "1\n00:00:01,000 --> 00:00:02,500\nHello\n\n2\n00:00:03,000 --> 00:00:04,000\nWorld\n\n"
+
+def test_vtt_drops_note_style_and_region_blocks():
+    text = ("WEBVTT\n\nSTYLE\n::cue { color: yellow }\n\nREGION\nid:fred width:40%\n\nNOTE a comment\nspanning lines\n\n"
+            "00:01.000 --> 00:02.000\nKept\n")
+    assert vtt(text) == "1\n00:00:01,000 --> 00:00:02,000\nKept\n\n"
+
+def test_vtt_strips_inline_tags_and_entities():
+    text = "WEBVTT\n\n00:00:01.000 --> 00:00:02.000\n<v Roger>Hi <b>there</b><00:00:01.500><c> &amp; bye</c>\n<i></i>\n"
+    assert vtt(text) == "1\n00:00:01,000 --> 00:00:02,000\nHi there & bye\n\n"
+
+def test_vtt_skips_cues_left_empty():
+    text = "WEBVTT\n\n00:00:01.000 --> 00:00:02.000\n<c> </c>\n\n00:00:02.000 --> 00:00:03.000\nNext\n"
+    assert vtt(text) == "1\n00:00:02,000 --> 00:00:03,000\nNext\n\n"
+
+def test_vtt_timestamps():
+    assert app.vtt_ms("01:02.345") == 62345
+    assert app.vtt_ms(" 1:00:00.001 ") == 3600001
+    assert app.srt_timestamp(app.vtt_ms("12:34.5")) == "00:12:34,500"
+
+def test_json3_segments_and_blank_events():
+    events = [{"tStartMs": 0, "dDurationMs": 1500, "segs": [{"utf8": "Hello "}, {"utf8": "world"}]},
+              {"tStartMs": 1500, "dDurationMs": 500, "segs": [{"utf8": "\n"}]},
+              {"tStartMs": 2000, "dDurationMs": 1000},
+              {"dDurationMs": 1000, "segs": [{"utf8": "no start"}]}]
+    assert json3(events) == "1\n00:00:00,000 --> 00:00:01,500\nHello world\n\n"
+
+def test_json3_event_without_duration_lasts_until_the_next():
+    events = [{"tStartMs": 1000, "segs": [{"utf8": "First"}]}, {"tStartMs": 4000, "segs": [{"utf8": "Last"}]}]
+    assert json3(events) == "1\n00:00:01,000 --> 00:00:04,000\nFirst\n\n2\n00:00:04,000 --> 00:00:06,000\nLast\n\n"
+
+def test_srt_passes_through():
+    assert app.subtitle_to_srt("1\n00:00:01,000 --> 00:00:02,000\nx\n", "srt") == ["1\n00:00:01,000 --> 00:00:02,000\nx\n"]
@@ -1,5 +1,8 @@
 # yt-dlp Downloader GUI v1.4.11x (by Bluz J & Nai 2026.01.02)
+import time
+STARTUP_T0 = time.perf_counter()
 import os
+import argparse
 import json
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
@@ -10,14 +13,44 @@ import socket
 import shutil
 import subprocess
 import platform
+import sqlite3
+import zlib
 import sys
-
-# Dependency check
-try:
-    from yt_dlp import YoutubeDL
-except ImportError:
-    messagebox.showerror("Error", "Module 'yt-dlp' not found!\nPlease run: pip install yt-dlp")
+import queue
+import logging
+import logging.handlers
+import importlib.util
+import http.client
+import http.server
+import html
+import urllib.parse
+import urllib.request
+import itertools
+from collections import Counter
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+# Dependency check: yt-dlp pulls in hundreds of extractor modules, so it is only located here and
+# imported on first use (the GUI starts that import in the background once the window is up)
+if importlib.util.find_spec("yt_dlp") is None:
+    if __name__ == "__main__" and len(sys.argv) == 1: messagebox.showerror("Error", "Module 'yt-dlp' not found!\nPlease run: pip install yt-dlp")
+    else: print("Module 'yt-dlp' not found! Please run: pip install yt-dlp", file=sys.stderr)
     sys.exit()
+YoutubeDL, DownloadError, DownloadCancelled, yt_dlp_lock = None, None, None, threading.Lock()
+
+def import_yt_dlp():
+    global YoutubeDL, DownloadError, DownloadCancelled
+    with yt_dlp_lock:
+        if YoutubeDL is None:
+            from yt_dlp import YoutubeDL as youtube_dl_class
+            from yt_dlp.utils import DownloadError as download_error_class, DownloadCancelled as download_cancelled_class
+            YoutubeDL, DownloadError, DownloadCancelled = youtube_dl_class, download_error_class, download_cancelled_class
+    return YoutubeDL
+
+def preload_yt_dlp():
+    started = time.perf_counter()
+    import_yt_dlp()
+    logger.info(f"yt-dlp loaded in background in {time.perf_counter() - started:.2f}s")
 
 # Core settings and path determination
 if getattr(sys, 'frozen', False):
@@ -27,7 +60,29 @@ else:
 
 CONFIG_FILE = os.path.join(script_dir, "config.json")
 HISTORY_FILE = os.path.join(script_dir, "download_history.json")
+HISTORY_DB = os.path.join(script_dir, "download_history.db")
+METADATA_CACHE_DB = os.path.join(script_dir, "metadata_cache.db")
+JOB_QUEUE_DB = os.path.join(script_dir, "job_queue.db")
+LOG_FILE = os.path.join(script_dir, "ytdlpgui.log")
 socket.setdefaulttimeout(20)
+ANALYSIS_BATCH_SIZE = 25
+INFO_FALLBACK_TTL, INFO_EXPIRY_MARGIN = 3 * 3600, 600
+SUBTITLE_SOURCE_FORMATS = ("srt", "json3", "vtt")  # converted in-process, in order of preference
+QUEUE_ORDERS = {"listed": "As listed", "shortest": "Shortest first", "largest": "Largest first", "channel": "Mix channels"}
+TYPICAL_VIDEO_KBPS, TYPICAL_AUDIO_KBPS = {2160: 20000, 1440: 10000, 1080: 5000, 720: 2500, 480: 1200, 0: 700}, 160  # size guess when formats are unknown
+TYPICAL_BYTES = {"cover": 100_000, "subtitle": 50_000}
+ETA_REPORT_S = 1.0
+WORKER_POLL_S, WORKER_HEARTBEAT_S = 5, 20
+# What a worker may set for itself; everything else about a job comes from the coordinator's batch options
+WORKER_LOCAL_OPTIONS = ("download_path", "parallel_downloads", "bandwidth_limit_kbs", "concurrent_fragments", "metrics_file", "shared_store", "single_pass")
+COVER_BATCH_SIZE = 50  # images per ffmpeg run, keeps the command line under Windows' length limit
+HTTP_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+UI_FRAME_MS, UI_MAX_EVENTS_PER_FRAME, LOG_WIDGET_MAX_LINES = 50, 5000, 2000
+METRIC_PHASES = ("queue_wait", "extract", "download", "merge", "thumbnail", "postprocess", "transcode_wait", "convert", "rename")
+POSTPROCESSOR_PHASES = {
+    "Merger": "merge", "EmbedThumbnail": "thumbnail", "ThumbnailsConvertor": "thumbnail", "ExtractAudio": "convert",
+    "VideoConvertor": "convert", "VideoRemuxer": "convert", "MoveFiles": "rename",
+}
 
 # Audio Quality Map
 AUDIO_QUALITY_MAP = {
@@ -37,9 +92,20 @@ AUDIO_QUALITY_MAP = {
 REVERSE_AUDIO_QUALITY_MAP = {v: k for k, v in AUDIO_QUALITY_MAP.items()}
 
 # Global variables
-preview_tree = None 
-cancel_event, download_thread, loading_animation_id = threading.Event(), None, None
+preview_tree, log_text, history_db, metadata_db, queue_db = None, None, None, None, None
+cancel_event, download_thread, loading_animation_id, sync_timer_id = threading.Event(), None, None, None
+coordinator, synced_preview = None, False
+child_processes, child_lock = set(), threading.Lock()
+history_lock, cache_lock, queue_lock = threading.Lock(), threading.Lock(), threading.Lock()
 loading_animation_state, last_sort_column, sort_direction = 0, "", "ascending"
+analysis_generation, analysis_count = 0, 0
+ui_events, logger = queue.SimpleQueue(), logging.getLogger("ytdlpgui")
+preview_entries, preview_order, checked_keys, sort_cache = {}, [], set(), {}
+preview_video_keys = {}  # video_id -> first row key, so a video shared by several playlists is listed once
+checked_sub_langs, all_sub_langs, view_offset, view_rows = Counter(), Counter(), 0, 15
+last_stats, stats_window = {}, None
+hydrate_pool, hydrate_pending, hydrate_wanted, hydrate_local = None, set(), set(), threading.local()
+http_local = threading.local()
 
 # Default configuration
 config = {
@@ -55,7 +121,26 @@ config = {
     "subtitle_language": "en", 
     "add_track_number": True,
     "url_history": [],
-    "playlist_limit": 0 
+    "playlist_limit": 0,
+    "parallel_downloads": 3,
+    "bandwidth_limit_kbs": 0,
+    "concurrent_fragments": 4,
+    "overwrite_policy": "ask",
+    "queue_order": "listed",
+    "sync_interval_minutes": 0,
+    "single_pass_mux": True,
+    "coordinator_host": "127.0.0.1",
+    "coordinator_port": 8770,
+    "coordinator_token": "",
+    "worker_lease_seconds": 120,
+    "hydrate_workers": 4,
+    "analysis_workers": 4,
+    "cover_workers": 16,
+    "subtitle_workers": 8,
+    "shared_store": True,
+    "metadata_cache_ttl_hours": 24,
+    "metadata_cache_max_entries": 20000,
+    "metrics_file": ""
 }
 
 # Load configuration
@@ -73,17 +158,6 @@ try:
 except (IOError, json.JSONDecodeError) as e: 
     print(f"Error loading config: {e}")
 
-# Load history
-download_history = {}
-try:
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-            loaded_history = json.load(f)
-            if isinstance(loaded_history, dict):
-                download_history = loaded_history
-except Exception as e:
-    print(f"Error loading history: {e}")
-
 def save_config():
     try:
         with open(CONFIG_FILE, "w", encoding="utf-8") as f:
@@ -103,20 +177,316 @@ def save_config():
     except IOError as e:
         log_message(f"Error saving config: {e}")
 
-def save_history():
+# --- Download History Store ---
+def open_history():
+    global history_db
+    with history_lock:
+        if history_db is None:
+            db = sqlite3.connect(HISTORY_DB, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL"); db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE TABLE IF NOT EXISTS history (video_id TEXT PRIMARY KEY, last_download TEXT NOT NULL) WITHOUT ROWID")
+            migrate_json_history(db)
+            history_db = db
+    return history_db
+
+def migrate_json_history(db):
+    # One-time import of the legacy download_history.json, kept as .migrated afterwards
+    if not os.path.exists(HISTORY_FILE): return
     try:
-        with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-            json.dump(download_history, f, indent=4)
-    except IOError as e:
+        with open(HISTORY_FILE, "r", encoding="utf-8") as f: legacy = json.load(f)
+        if isinstance(legacy, dict):
+            with db: db.executemany("INSERT OR IGNORE INTO history VALUES (?, ?)", [(str(k), str(v)) for k, v in legacy.items()])
+        os.replace(HISTORY_FILE, HISTORY_FILE + ".migrated")
+        print(f"Migrated {len(legacy)} history entries to {os.path.basename(HISTORY_DB)}")
+    except (IOError, json.JSONDecodeError, sqlite3.Error) as e:
+        print(f"Error migrating history: {e}")
+
+def get_history(video_id):
+    db = open_history()
+    with history_lock:
+        row = db.execute("SELECT last_download FROM history WHERE video_id = ?", (video_id,)).fetchone()
+    return row[0] if row else None
+
+def get_history_many(video_ids):
+    db, video_ids, found = open_history(), list(set(video_ids)), {}
+    with history_lock:
+        for i in range(0, len(video_ids), 500):
+            chunk = video_ids[i:i + 500]
+            found.update(db.execute(f"SELECT video_id, last_download FROM history WHERE video_id IN ({','.join('?' * len(chunk))})", chunk))
+    return found
+
+def record_history(video_id, timestamp=None):
+    timestamp = timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    db = open_history()
+    try:
+        with history_lock, db: db.execute("INSERT OR REPLACE INTO history VALUES (?, ?)", (video_id, timestamp))
+    except sqlite3.Error as e:
         log_message(f"Error saving history: {e}")
+    return timestamp
+
+def compact_history():
+    if history_db is None: return
+    db = history_db
+    try:
+        with history_lock:
+            page_count = db.execute("PRAGMA page_count").fetchone()[0]
+            free_count = db.execute("PRAGMA freelist_count").fetchone()[0]
+            if page_count and free_count * 4 > page_count: db.execute("VACUUM")
+            db.execute("PRAGMA optimize"); db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    except sqlite3.Error as e:
+        print(f"Error compacting history: {e}")
+
+# --- Metadata Cache ---
+def open_metadata_cache():
+    global metadata_db
+    with cache_lock:
+        if metadata_db is None:
+            db = sqlite3.connect(METADATA_CACHE_DB, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL"); db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE TABLE IF NOT EXISTS videos (video_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL, accessed REAL NOT NULL) WITHOUT ROWID")
+            db.execute("CREATE TABLE IF NOT EXISTS urls (url_key TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL, accessed REAL NOT NULL) WITHOUT ROWID")
+            db.execute("CREATE TABLE IF NOT EXISTS infos (video_id TEXT PRIMARY KEY, data BLOB NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL) WITHOUT ROWID")
+            db.execute("CREATE INDEX IF NOT EXISTS videos_accessed ON videos (accessed)")
+            db.execute("CREATE INDEX IF NOT EXISTS urls_accessed ON urls (accessed)")
+            db.execute("CREATE INDEX IF NOT EXISTS infos_accessed ON infos (accessed)")
+            metadata_db = db
+    return metadata_db
+
+def compact_entry(entry):
+    # Only what the preview needs; full info dicts are never cached
+    formats = [{k: fmt.get(k) for k in ("format_id", "ext", "height", "vcodec", "acodec", "filesize", "filesize_approx", "tbr") if fmt.get(k) is not None}
+               for fmt in entry.get("formats") or []]
+    subtitles = {lang: [{"ext": t.get("ext"), "url": t.get("url")} for t in tracks if t.get("url")]
+                 for lang, tracks in (entry.get("subtitles") or {}).items()}
+    compact = {
+        "id": entry.get("id") or smuggled_video_id(entry.get("url")), "title": entry.get("title") or "Unknown", "duration": entry.get("duration"),
+        "live_status": entry.get("live_status"), "webpage_url": entry.get("webpage_url") or entry.get("url"),
+        "uploader": entry.get("uploader"), "playlist_index": entry.get("playlist_index"),
+        "thumbnail": entry.get("thumbnail") or next((t["url"] for t in reversed(entry.get("thumbnails") or []) if t.get("url")), None),
+        "subtitles": subtitles, "formats": formats,
+        "flat": entry.get("_type") in ("url", "url_transparent") or None, "ie_key": entry.get("ie_key"),
+        "heights": sorted({f["height"] for f in formats if f.get("height") and f.get("vcodec") != "none"}, reverse=True),
+    }
+    return {k: v for k, v in compact.items() if v not in (None, [], {})}
+
+def smuggled_video_id(url):
+    # Flat entries from the generic extractor (RSS, direct links) carry their id only inside the smuggled URL data
+    if not url or "#__youtubedl_smuggle=" not in url: return ""
+    from yt_dlp.utils import unsmuggle_url
+    return str(unsmuggle_url(url)[1].get("force_videoid") or "")
+
+def cache_is_fresh(updated):
+    ttl = float(config.get("metadata_cache_ttl_hours", 24)) * 3600
+    return ttl > 0 and time.time() - updated < ttl
+
+def cache_get_url(url_key):
+    db = open_metadata_cache()
+    with cache_lock, db:
+        row = db.execute("SELECT data, updated FROM urls WHERE url_key = ?", (url_key,)).fetchone()
+        if not row or not cache_is_fresh(row[1]): return None
+        db.execute("UPDATE urls SET accessed = ? WHERE url_key = ?", (time.time(), url_key))
+    record = json.loads(row[0]); record["updated"] = row[1]
+    return record
+
+def cache_get_videos(video_ids):
+    db, video_ids, found = open_metadata_cache(), list(set(video_ids)), {}
+    with cache_lock, db:
+        for i in range(0, len(video_ids), 500):
+            chunk = video_ids[i:i + 500]
+            for video_id, data, updated in db.execute(f"SELECT video_id, data, updated FROM videos WHERE video_id IN ({','.join('?' * len(chunk))})", chunk):
+                if cache_is_fresh(updated): found[video_id] = json.loads(data)
+        db.executemany("UPDATE videos SET accessed = ? WHERE video_id = ?", [(time.time(), video_id) for video_id in found])
+    return found
+
+def cache_put_videos(entries):
+    now, db = time.time(), open_metadata_cache()
+    rows = [((e["id"], json.dumps({k: v for k, v in e.items() if k != "playlist_index"}), now, now), bool(e.get("flat"))) for e in entries if e.get("id")]
+    try:
+        # Flat listings refresh flat rows but never overwrite a fully extracted entry while it is still fresh
+        stale_before = now - float(config.get("metadata_cache_ttl_hours", 24)) * 3600
+        with cache_lock, db:
+            db.executemany("INSERT INTO videos VALUES (?, ?, ?, ?) ON CONFLICT (video_id) DO UPDATE SET "
+                           "data = CASE WHEN json_extract(videos.data, '$.flat') OR videos.updated < ? THEN excluded.data ELSE videos.data END, "
+                           "updated = CASE WHEN json_extract(videos.data, '$.flat') OR videos.updated < ? THEN excluded.updated ELSE videos.updated END, "
+                           "accessed = excluded.accessed", [row + (stale_before, stale_before) for row, flat in rows if flat])
+            db.executemany("INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?)", [row for row, flat in rows if not flat])
+    except sqlite3.Error as e:
+        log_message(f"Error writing metadata cache: {e}")
+
+def cache_put_url(url_key, record):
+    now, db = time.time(), open_metadata_cache()
+    try:
+        with cache_lock, db: db.execute("INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?)", (url_key, json.dumps(record), now, now))
+    except sqlite3.Error as e:
+        log_message(f"Error writing metadata cache: {e}")
+
+def format_url_expiry(info):
+    # Signed media URLs carry their expiry (expire=<unix time>); fall back to a conservative TTL
+    expiries = [int(m.group(1)) for fmt in info.get("formats") or [] for m in [re.search(r"[?&/]expire[=/](\d+)", fmt.get("url") or "")] if m]
+    return min(expiries) if expiries else time.time() + INFO_FALLBACK_TTL
+
+def cache_put_info(info):
+    # Full (sanitized) info dict so downloads can skip the second extraction round-trip
+    if not info.get("id") or not info.get("formats") or info.get("_type", "video") != "video": return
+    expires = format_url_expiry(info)
+    info = import_yt_dlp().sanitize_info({k: v for k, v in info.items() if k != "automatic_captions"}, True)
+    now, db = time.time(), open_metadata_cache()
+    try:
+        data = zlib.compress(json.dumps(info).encode("utf-8"), 6)
+        with cache_lock, db: db.execute("INSERT OR REPLACE INTO infos VALUES (?, ?, ?, ?)", (info["id"], data, expires, now))
+    except (sqlite3.Error, TypeError, ValueError) as e:
+        log_message(f"Error writing info cache: {e}")
+
+def cache_get_info(video_id):
+    db = open_metadata_cache()
+    with cache_lock, db:
+        row = db.execute("SELECT data FROM infos WHERE video_id = ? AND expires > ?", (video_id, time.time() + INFO_EXPIRY_MARGIN)).fetchone()
+        if not row: return None
+        db.execute("UPDATE infos SET accessed = ? WHERE video_id = ?", (time.time(), video_id))
+    return json.loads(zlib.decompress(row[0]))
+
+def evict_metadata_cache():
+    max_entries, db = int(config.get("metadata_cache_max_entries", 20000)), open_metadata_cache()
+    try:
+        with cache_lock, db:
+            db.execute("DELETE FROM infos WHERE expires < ?", (time.time(),))
+            for table, key in (("videos", "video_id"), ("urls", "url_key"), ("infos", "video_id")):
+                excess = db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] - max_entries
+                if excess > 0: db.execute(f"DELETE FROM {table} WHERE {key} IN (SELECT {key} FROM {table} ORDER BY accessed LIMIT ?)", (excess,))
+    except sqlite3.Error as e:
+        log_message(f"Error trimming metadata cache: {e}")
+
+# --- Job Queue ---
+UNFINISHED_STATES = ("queued", "downloading", "post-processing")
+
+def open_job_queue():
+    global queue_db
+    with queue_lock:
+        if queue_db is None:
+            db = sqlite3.connect(JOB_QUEUE_DB, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL"); db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE TABLE IF NOT EXISTS batches (batch_id INTEGER PRIMARY KEY, options TEXT NOT NULL, created REAL NOT NULL)")
+            # state: queued -> downloading -> post-processing -> done | failed (cancelled items go back to queued)
+            db.execute("CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, batch_id INTEGER NOT NULL, position INTEGER NOT NULL, target TEXT NOT NULL, "
+                       "state TEXT NOT NULL, job TEXT NOT NULL, transcode TEXT, error TEXT, updated REAL NOT NULL) WITHOUT ROWID")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id, position)")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_target ON jobs (target)")
+            queue_db = db
+    return queue_db
+
+def enqueue_jobs(jobs, options):
+    # Persisted before the first transfer; a re-queued item supersedes its unfinished copy from an older batch
+    now, db = time.time(), open_job_queue()
+    rows = [(f"{options['download_type']}:{job['url']}", job) for job in jobs]
+    try:
+        with queue_lock, db:
+            for i in range(0, len(rows), 500):
+                chunk = [target for target, _ in rows[i:i + 500]]
+                db.execute(f"DELETE FROM jobs WHERE state IN ('queued', 'downloading') AND target IN ({','.join('?' * len(chunk))})", chunk)
+            db.execute("DELETE FROM batches WHERE batch_id NOT IN (SELECT batch_id FROM jobs)")
+            batch_id = db.execute("INSERT INTO batches (options, created) VALUES (?, ?)", (json.dumps(options), now)).lastrowid
+            jobs = [dict(job, job_id=f"{batch_id}:{position}") for position, (_, job) in enumerate(rows, start=1)]
+            db.executemany("INSERT INTO jobs VALUES (?, ?, ?, ?, 'queued', ?, NULL, NULL, ?)",
+                           [(job["job_id"], batch_id, position, target, json.dumps(job), now) for position, ((target, _), job) in enumerate(zip(rows, jobs), start=1)])
+    except sqlite3.Error as e:
+        log_message(f"Error writing job queue, this batch will not be resumable: {e}")
+    return jobs
+
+def set_job_state(job_id, state, transcode=None, error=None):
+    if not job_id: return
+    db = open_job_queue()
+    try:
+        with queue_lock, db:
+            # A pending conversion is kept until it is replaced, so an item cancelled mid-conversion resumes at the conversion
+            db.execute("UPDATE jobs SET state = ?, transcode = COALESCE(?, transcode), error = ?, updated = ? WHERE job_id = ?",
+                       (state, json.dumps(transcode) if transcode else None, error, time.time(), job_id))
+    except sqlite3.Error as e:
+        log_message(f"Error updating job queue: {e}")
+
+def load_unfinished_jobs():
+    # Oldest batch first, each with the options it was started with
+    db, pending = open_job_queue(), {}
+    with queue_lock:
+        batches = db.execute("SELECT batch_id, options, created FROM batches ORDER BY batch_id").fetchall()
+        rows = db.execute(f"SELECT batch_id, job, transcode FROM jobs WHERE state IN ({','.join('?' * len(UNFINISHED_STATES))}) ORDER BY batch_id, position", UNFINISHED_STATES).fetchall()
+    for batch_id, job, transcode in rows:
+        job = json.loads(job)
+        if transcode: job["transcode"] = json.loads(transcode)
+        pending.setdefault(batch_id, []).append(job)
+    return [{"batch_id": batch_id, "options": json.loads(options), "created": created, "jobs": pending[batch_id]}
+            for batch_id, options, created in batches if batch_id in pending]
+
+def next_queued_jobs(batch_ids, count, exclude=()):
+    # Oldest unfinished jobs of the given batches that aren't out on a lease, each with its batch options
+    if not batch_ids: return []
+    db, batch_ids = open_job_queue(), list(batch_ids)
+    with queue_lock:
+        rows = db.execute(f"SELECT j.job_id, j.job, b.options FROM jobs j JOIN batches b ON b.batch_id = j.batch_id "
+                          f"WHERE j.state IN ({','.join('?' * len(UNFINISHED_STATES))}) AND j.batch_id IN ({','.join('?' * len(batch_ids))}) "
+                          f"ORDER BY j.batch_id, j.position LIMIT ?", (*UNFINISHED_STATES, *batch_ids, count + len(exclude))).fetchall()
+    return [(job_id, json.loads(job), json.loads(options)) for job_id, job, options in rows if job_id not in exclude][:count]
+
+def prune_job_queue(batch_ids=None):
+    # Drops the given batches, or every batch with nothing left to resume
+    db = open_job_queue()
+    try:
+        with queue_lock, db:
+            if batch_ids is not None:
+                db.executemany("DELETE FROM jobs WHERE batch_id = ?", [(b,) for b in batch_ids])
+            else:
+                db.execute(f"DELETE FROM jobs WHERE batch_id NOT IN (SELECT batch_id FROM jobs WHERE state IN ({','.join('?' * len(UNFINISHED_STATES))}))", UNFINISHED_STATES)
+            db.execute("DELETE FROM batches WHERE batch_id NOT IN (SELECT batch_id FROM jobs)")
+    except sqlite3.Error as e:
+        log_message(f"Error trimming job queue: {e}")
 
 def sanitize_filename(filename):
     s = re.sub(r'[\\/:*?"<>|]', '_', filename)
     return s.strip().rstrip('.')
 
 def log_message(msg): 
-    log_text.insert(tk.END, f"{datetime.now().strftime('%H:%M:%S')} - {msg}\n")
-    log_text.see(tk.END)
+    # Safe from any thread: the widget is only touched by drain_ui_events()
+    logger.info(msg)
+    line = f"{datetime.now().strftime('%H:%M:%S')} - {msg}"
+    if log_text is None: sys.stderr.write(line + "\n")  # one write, so lines from parallel workers don't interleave
+    else: post_ui("log", line)
+
+# --- UI Event Queue ---
+def post_ui(kind, *args):
+    ui_events.put((kind, args))
+
+def run_on_ui(func, *args):
+    ui_events.put(("call", (func, args)))
+
+def drain_ui_events():
+    # Coalesces per frame: one log insert, last progress value per row, last overall value
+    lines, progress, overall = [], {}, None
+    try:
+        for _ in range(UI_MAX_EVENTS_PER_FRAME):
+            kind, args = ui_events.get_nowait()
+            if kind == "log": lines.append(args[0])
+            elif kind == "progress": progress[args[0]] = args[1]
+            elif kind == "overall": overall = args[0]
+            elif kind == "call":
+                try: args[0](*args[1])
+                except Exception as e: logger.exception(f"UI callback failed: {e}")
+    except queue.Empty: pass
+
+    if lines:
+        log_text.insert(tk.END, "\n".join(lines) + "\n")
+        excess = int(log_text.index("end-1c").split(".")[0]) - 1 - LOG_WIDGET_MAX_LINES
+        if excess > 0: log_text.delete("1.0", f"{excess + 1}.0")
+        log_text.see(tk.END)
+    for key, text in progress.items(): set_entry_status(key, text)
+    if overall is not None: progress_var.set(overall)
+    root.after(UI_FRAME_MS, drain_ui_events)
+
+def setup_file_log():
+    try:
+        handler = logging.handlers.RotatingFileHandler(LOG_FILE, maxBytes=5 * 1024 * 1024, backupCount=3, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(threadName)s - %(message)s"))
+        logger.addHandler(handler); logger.setLevel(logging.INFO)
+    except OSError as e:
+        print(f"Error opening log file: {e}", file=sys.stderr)
 
 def open_folder(path):
     if os.path.exists(path):
@@ -159,7 +529,8 @@ def update_url_combo_values():
 def start_loading_animation():
     global loading_animation_id, loading_animation_state
     states, loading_animation_state = ["", ".", "..", "..."], (loading_animation_state + 1) % 4
-    loading_label.config(text=f"Analyzing{states[loading_animation_state]}")
+    count_text = f" ({analysis_count})" if analysis_count else ""
+    loading_label.config(text=f"Analyzing{states[loading_animation_state]}{count_text}")
     loading_animation_id = root.after(500, start_loading_animation)
 
 def stop_loading_animation():
@@ -181,121 +552,374 @@ def parse_video():
     url = url_combo.get().strip()
     if not url: return log_message("Error: Please enter a URL.")
     add_url_history()
-    log_message("Analyzing..."); start_loading_animation()
+    start_analysis([url])
+
+def parse_saved_urls():
+    # Every saved URL at once, merged into one queue with each video listed once
+    urls = config.get("url_history", [])
+    if not urls: return log_message("Error: No saved URLs to analyze.")
+    log_message(f"Analyzing {len(urls)} saved URLs...")
+    start_analysis(urls)
+
+def start_analysis(urls):
+    global analysis_count
+    clear_preview(); analysis_count = 0
+    generation = analysis_generation
+    log_message("Analyzing..."); stop_loading_animation(); start_loading_animation()
     
     try:
         limit_count = int(playlist_limit_spin.get())
     except ValueError:
         limit_count = 0
+    force_refresh = force_refresh_var.get()
+
+    def on_batch(url, batch, content_type, playlist_title, channel_name):
+        run_on_ui(insert_preview_batch, generation, batch, content_type, playlist_title, channel_name)
         
     def task():
         try:
-            ydl_opts = {
-                "quiet": True, 
-                "ignoreerrors": True,
-                "extractor_args": {'youtube': ['player_client=default']}
-            }
-            
-            if limit_count > 0:
-                ydl_opts["playlistend"] = limit_count
-                log_message(f"Limit applied: parsing first {limit_count} videos only.")
-
-            if "youtube.com/@" in url and any(x in url for x in ["/videos", "/shorts", "/streams"]):
-                log_message("Channel detected, using 'extract_flat' for speed...")
-                ydl_opts["extract_flat"] = True
-                
-            with YoutubeDL(ydl_opts) as ydl: info = ydl.extract_info(url, download=False)
-            preview_tree.delete(*preview_tree.get_children())
-            
-            if not info: return log_message("Analysis failed: Invalid URL or network error.")
-            
-            if "entries" in info:
-                entries = [e for e in info.get("entries", []) if e]
-                if not entries: return log_message("No videos found.")
-                playlist_title = sanitize_filename(info.get("title", "Unknown Playlist"))
-                channel_name = sanitize_filename(info.get("uploader", "Unknown Channel"))
-                update_video_resolution_combo(info.get("formats", []))
-                for idx, entry in enumerate(entries, start=1):
-                    entry['playlist_index'] = entry.get('playlist_index') or idx
-                    add_preview_item(idx, entry, "playlist_video", playlist_title, channel_name)
-                log_message(f"Analysis complete. Found {len(entries)} items.")
-            else:
-                add_preview_item(1, info, "video", channel_name=sanitize_filename(info.get("uploader", "Unknown Channel")))
-                update_video_resolution_combo(info.get("formats", []))
-                log_message("Analysis complete.")
+            summaries = analyze_urls(urls, limit_count, force_refresh, on_batch, is_stale=lambda: generation != analysis_generation)
+            if len(summaries) == 1 and summaries[0]: run_on_ui(update_video_resolution_combo, summaries[0]["formats"])
         except Exception as e: log_message(f"Critical error during analysis: {e}")
-        finally: stop_loading_animation(); update_subtitle_controls()
-    threading.Thread(target=task).start()
+        finally:
+            if generation == analysis_generation: run_on_ui(finish_analysis)
+    threading.Thread(target=task, daemon=True).start()
+
+# --- Analysis Engine ---
+def analyze_urls(urls, limit_count=0, force_refresh=False, on_batch=None, is_stale=lambda: False):
+    # Several playlists/channels side by side; on_batch(url, batch, ...) is called from the analysis threads
+    urls, on_batch = list(dict.fromkeys(url for url in urls if url)), on_batch or (lambda *args: None)
+    def analyze(url):
+        try: return analyze_url(url, limit_count, force_refresh, lambda *args: on_batch(url, *args), is_stale)
+        except Exception as e: log_message(f"Error analyzing {url}: {e}")
+    if len(urls) <= 1: return [analyze(url) for url in urls]
+    with ThreadPoolExecutor(max_workers=max(1, min(len(urls), int(config.get("analysis_workers", 4)))), thread_name_prefix="analyze") as pool:
+        return list(pool.map(analyze, urls))
+
+def analyze_url(url, limit_count=0, force_refresh=False, on_batch=None, is_stale=lambda: False):
+    # GUI-free: streams compact entries to on_batch(batch, content_type, playlist_title, channel_name)
+    on_batch = on_batch or (lambda *args: None)
+    url_key = f"{url}#limit={limit_count}" if limit_count > 0 else url
+    if not force_refresh:
+        summary = load_cached_analysis(url_key, on_batch)
+        if summary: return summary
+
+    # Phase one is always a flat listing; formats, subtitles and exact durations come from hydrate_entry() on demand
+    ydl_opts = analysis_ydl_opts()
+    
+    if limit_count > 0:
+        ydl_opts["playlistend"] = limit_count
+        log_message(f"Limit applied: parsing first {limit_count} videos only.")
+        
+    with import_yt_dlp()(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False, process=False)
+        if not info: return log_message("Analysis failed: Invalid URL or network error.")
+        if info.get("_type") not in ("playlist", "multi_video"):
+            info = ydl.process_ie_result(info, download=False)
+            if not info: return log_message("Analysis failed: Invalid URL or network error.")
 
-def add_preview_item(index, entry, content_type, playlist_title="", channel_name=""):
-    video_id, title = entry.get("id", ""), sanitize_filename(entry.get("title", "Unknown"))
-    url = entry.get("webpage_url") or entry.get("url") or "N/A"
+        if "entries" in info:
+            playlist_title = sanitize_filename(info.get("title") or "Unknown Playlist")
+            channel_name = sanitize_filename(info.get("uploader") or info.get("channel") or "Unknown Channel")
+            batch, listing, last_flush = [], [], time.monotonic()
+            for idx, entry in iter_playlist_entries(ydl, info, limit_count, use_cache=not force_refresh):
+                if is_stale(): return None
+                batch.append((idx, entry)); listing.append([entry.get("id"), entry.get("playlist_index")])
+                if len(batch) >= ANALYSIS_BATCH_SIZE or time.monotonic() - last_flush > 0.5:
+                    cache_put_videos([e for _, e in batch])
+                    on_batch(batch, "playlist_video", playlist_title, channel_name)
+                    batch, last_flush = [], time.monotonic()
+            if batch:
+                cache_put_videos([e for _, e in batch])
+                on_batch(batch, "playlist_video", playlist_title, channel_name)
+            if not listing: return log_message("No videos found.")
+            if all(video_id for video_id, _ in listing):
+                cache_put_url(url_key, {"type": "playlist", "title": playlist_title, "uploader": channel_name, "entries": listing})
+            log_message(f"Analysis complete. Found {len(listing)} items.")
+            summary = {"count": len(listing), "formats": info.get("formats") or []}
+        else:
+            cache_put_info(info)
+            entry = compact_entry(info)
+            channel_name = sanitize_filename(info.get("uploader") or "Unknown Channel")
+            if entry.get("id"):
+                cache_put_videos([entry])
+                cache_put_url(url_key, {"type": "video", "uploader": channel_name, "entries": [[entry["id"], None]]})
+            on_batch([(1, entry)], "video", "", channel_name)
+            log_message("Analysis complete.")
+            summary = {"count": 1, "formats": entry.get("formats") or []}
+    evict_metadata_cache()
+    return summary
+
+def load_cached_analysis(url_key, on_batch):
+    record = cache_get_url(url_key)
+    if not record: return None
+    videos = cache_get_videos([video_id for video_id, _ in record["entries"]])
+    if len(videos) < len({video_id for video_id, _ in record["entries"]}): return None
+
+    analyzed_at = datetime.fromtimestamp(record["updated"]).strftime("%Y-%m-%d %H:%M")
+    log_message(f"Loaded {len(record['entries'])} items from cache (analyzed {analyzed_at}). Use 'Force Refresh' to re-analyze.")
+    if record["type"] == "video":
+        entry = videos[record["entries"][0][0]]
+        on_batch([(1, entry)], "video", "", record["uploader"])
+        return {"count": 1, "formats": entry.get("formats") or []}
+    batch = []
+    for idx, (video_id, playlist_index) in enumerate(record["entries"], start=1):
+        batch.append((idx, dict(videos[video_id], playlist_index=playlist_index or idx)))
+        if len(batch) >= ANALYSIS_BATCH_SIZE * 20:
+            on_batch(batch, "playlist_video", record["title"], record["uploader"]); batch = []
+    if batch: on_batch(batch, "playlist_video", record["title"], record["uploader"])
+    return {"count": len(record["entries"]), "formats": []}
+
+def analysis_ydl_opts():
+    return {
+        "quiet": True, 
+        "ignoreerrors": True,
+        "extract_flat": "in_playlist",
+        "extractor_args": {'youtube': ['player_client=default']}
+    }
+
+# --- Sync ---
+def sync_sources(urls, limit_count=0):
+    # Every source side by side; new jobs come back in source order, deduplicated like a multi-URL analysis
+    per_url = {url: [] for url in urls if url}
+    def sync(url):
+        try: per_url[url] = sync_url(url, limit_count)
+        except Exception as e: log_message(f"Error syncing {url}: {e}")
+    with ThreadPoolExecutor(max_workers=max(1, min(len(per_url), int(config.get("analysis_workers", 4)))), thread_name_prefix="sync") as pool:
+        list(pool.map(sync, per_url))
+    jobs = dedupe_jobs([job for url_jobs in per_url.values() for job in url_jobs])
+    log_message(f"Sync complete: {len(jobs)} new videos from {len(per_url)} sources.")
+    return jobs
+
+def sync_url(url, limit_count=0):
+    # Listings are walked newest-first (channel tabs, feeds) and only until the first video already in the download
+    # history, so the later pages are never requested. Sources listed oldest-first (most playlists) need a full Analyze
+    with import_yt_dlp()(analysis_ydl_opts()) as ydl:
+        info = ydl.extract_info(url, download=False, process=False)
+        for _ in range(3):
+            # Follow redirects (e.g. a channel URL to its videos tab) without processing, so the entries stay lazy
+            if not info or info.get("_type") not in ("url", "url_transparent"): break
+            info = ydl.extract_info(info["url"], download=False, process=False, ie_key=info.get("ie_key"))
+        if not info or "entries" not in info: return []
+        playlist_title = sanitize_filename(info.get("title") or "Unknown Playlist")
+        channel_name = sanitize_filename(info.get("uploader") or info.get("channel") or "Unknown Channel")
+        new = []
+        for _, entry in iter_playlist_entries(ydl, info, limit_count):
+            if entry.get("id") and get_history(entry["id"]): break
+            new.append(entry)
+    cache_put_videos(new)
+    if new: log_message(f"{channel_name} / {playlist_title}: {len(new)} new")
+    return [make_job(entry, "playlist_video", playlist_title, channel_name) for entry in new]
+
+def iter_playlist_entries(ydl, info, limit_count, use_cache=True):
+    # Entries stay lazy (generator/PagedList) so rows appear while later pages are still being fetched.
+    # Flat entries are not resolved here; a cached full entry is used when there is one
+    entries = info.get("entries") or []
+    if limit_count > 0: entries = itertools.islice(entries, limit_count)
+    for idx, entry in enumerate(entries, start=1):
+        if not entry: continue
+        entry = compact_entry(entry)
+        if use_cache and entry.get("flat") and entry.get("id"):
+            cached = cache_get_videos([entry["id"]]).get(entry["id"])
+            if cached and not cached.get("flat"): entry = dict(cached, title=entry.get("title") or cached.get("title"), playlist_index=entry.get("playlist_index"))
+        entry['playlist_index'] = entry.get('playlist_index') or idx
+        yield idx, entry
+
+def hydrate_entry(url, ie_key=None):
+    # Phase two for one flat-listed entry: full extraction on a per-thread YoutubeDL, cached like any analyzed video
+    if getattr(hydrate_local, "ydl", None) is None: hydrate_local.ydl = import_yt_dlp()(analysis_ydl_opts())
+    info = hydrate_local.ydl.extract_info(url, download=False, ie_key=ie_key)
+    if not info: return None
+    cache_put_info(info)
+    entry = compact_entry(info)
+    if entry.get("id"): cache_put_videos([entry])
+    return entry
+
+def insert_preview_batch(generation, batch, content_type, playlist_title="", channel_name=""):
+    global analysis_count
+    if generation != analysis_generation: return
+    history = get_history_many(entry.get("id", "") for _, entry in batch)
+    for idx, entry in batch:
+        # A video already listed from another playlist gets that folder as an extra link target instead of a second row
+        first = preview_entries.get(preview_video_keys.get(entry.get("id")))
+        if first: merge_link(first.links, first.job(), make_job(entry, content_type, playlist_title, channel_name)); continue
+        add_preview_item(len(preview_order) + 1, entry, content_type, playlist_title, channel_name, history)
+    analysis_count += len(batch)
+    render_view()
+
+def finish_analysis():
+    stop_loading_animation(); update_subtitle_controls()
+
+# --- Preview Model ---
+class PreviewEntry:
+    __slots__ = ("key", "url", "title", "video_id", "content_type", "playlist_title", "channel_name", "playlist_index",
+                 "duration_text", "duration_key", "title_key", "last_download", "sub_langs", "status", "flat", "ie_key", "links", "thumbnail")
+
+    def job(self):
+        return {"key": self.key, "url": self.url, "title": self.title, "video_id": self.video_id, "content_type": self.content_type,
+                "playlist_title": self.playlist_title, "channel_name": self.channel_name, "playlist_index": self.playlist_index, "links": list(self.links),
+                "thumbnail": self.thumbnail, "duration": self.duration_key if self.duration_key >= 0 else None}
+
+def clear_preview():
+    # New generation: a running analysis and queued hydrations of the old rows (same item keys) are dropped
+    global view_offset, analysis_generation, synced_preview
+    analysis_generation += 1; synced_preview = False
+    hydrate_pending.clear(); hydrate_wanted.clear()
+    preview_entries.clear(); preview_order.clear(); checked_keys.clear(); preview_video_keys.clear()
+    checked_sub_langs.clear(); all_sub_langs.clear(); sort_cache.clear()
+    view_offset = 0
+    render_view()
+
+def add_preview_item(index, entry, content_type, playlist_title="", channel_name="", history=None):
+    job = make_job(entry, content_type, playlist_title, channel_name)
+    e = PreviewEntry()
+    e.key, e.url, e.title, e.video_id = f"item{index}", job["url"], job["title"], job["video_id"]
+    e.content_type, e.playlist_title, e.channel_name, e.playlist_index = content_type, playlist_title, channel_name, job["playlist_index"]
+    e.thumbnail = job["thumbnail"]
+    set_entry_metadata(e, entry)
+    e.last_download = (history.get(e.video_id) if history is not None else get_history(e.video_id)) or "Not Downloaded"
+    e.sub_langs, e.status, e.flat, e.ie_key = tuple(sorted((entry.get("subtitles") or {}).keys())), "", bool(entry.get("flat")), entry.get("ie_key")
+    e.links = []
+    preview_entries[e.key] = e; preview_order.append(e.key)
+    if e.video_id: preview_video_keys.setdefault(e.video_id, e.key)
+    all_sub_langs.update(e.sub_langs); sort_cache.clear()
+    set_checked(e, True)
+    return e
+
+def set_entry_metadata(e, entry):
     duration, duration_text = entry.get("duration"), "Unknown"
     if duration is not None: duration_text = f"{int(duration)//60:02d}:{int(duration)%60:02d}"
     
     if entry.get("live_status") == "is_upcoming":
         duration_text = "Upcoming"
-        
-    last_download = download_history.get(video_id, "Not Downloaded")
-    subtitles = entry.get("subtitles")
-    available_langs = sorted(list(subtitles.keys())) if subtitles else []
-    playlist_index = entry.get('playlist_index', '')
-    preview_tree.insert("", tk.END, iid=f"item{index}", values=("☑", url, title, duration_text, last_download, video_id, content_type, playlist_title, channel_name, json.dumps(available_langs), playlist_index))
+    e.duration_text, e.duration_key, e.title_key = duration_text, int(duration) if duration is not None else -1, e.title.lower()
+
+def request_hydration(keys):
+    # Only rows the user can see (or has selected) get full metadata, on a bounded pool
+    global hydrate_pool, hydrate_wanted
+    hydrate_wanted = set(keys)
+    for key in keys:
+        e = preview_entries.get(key)
+        if e is None or not e.flat or key in hydrate_pending: continue
+        if hydrate_pool is None: hydrate_pool = ThreadPoolExecutor(max_workers=max(1, int(config.get("hydrate_workers", 4))), thread_name_prefix="hydrate")
+        hydrate_pending.add(key)
+        hydrate_pool.submit(hydrate_task, analysis_generation, key, e.url, e.ie_key)
+
+def hydrate_task(generation, key, url, ie_key):
+    # Rows scrolled away before a worker got to them are dropped and re-requested when they come back into view
+    if generation != analysis_generation or key not in hydrate_wanted: return run_on_ui(release_hydration, generation, key)
+    try: entry = hydrate_entry(url, ie_key)
+    except Exception as e: entry = None; logger.warning(f"Hydrating {url} failed: {e}")
+    run_on_ui(apply_hydration, generation, key, entry)
+
+def release_hydration(generation, key):
+    # Rows of an older preview share the item keys, so only this generation's pending marks are touched
+    if generation == analysis_generation: hydrate_pending.discard(key)
+
+def apply_hydration(generation, key, entry):
+    if generation != analysis_generation: return
+    hydrate_pending.discard(key)
+    e = preview_entries.get(key)
+    if e is None: return
+    e.flat = False
+    if not entry: return
+    set_entry_metadata(e, entry)
+    e.thumbnail = entry.get("thumbnail") or e.thumbnail
+    e.sub_langs = tuple(sorted((entry.get("subtitles") or {}).keys()))
+    all_sub_langs.update(e.sub_langs)
+    if e.key in checked_keys: checked_sub_langs.update(e.sub_langs)
+    sort_cache.pop("duration", None)
+    if preview_tree.exists(key): preview_tree.item(key, values=entry_values(e))
+    if e.sub_langs: update_subtitle_controls()
+
+def set_checked(e, checked):
+    if checked == (e.key in checked_keys): return
+    if checked: checked_keys.add(e.key); checked_sub_langs.update(e.sub_langs)
+    else:
+        checked_keys.discard(e.key); checked_sub_langs.subtract(e.sub_langs)
+        for lang in e.sub_langs:
+            if checked_sub_langs[lang] <= 0: del checked_sub_langs[lang]
+
+def set_entry_status(key, text):
+    e = preview_entries.get(key)
+    if e is None: return
+    e.status = text
+    if preview_tree.exists(key): preview_tree.set(key, "progress", text)
+
+def entry_values(e):
+    return ("☑" if e.key in checked_keys else "☐", e.url, e.title, e.duration_text, e.last_download, e.status)
+
+def render_view():
+    # Virtualized: only the rows inside the visible window exist as Treeview items
+    global view_offset
+    total = len(preview_order)
+    view_offset = max(0, min(view_offset, total - view_rows))
+    visible = preview_order[view_offset:view_offset + view_rows]
+    if tuple(visible) == preview_tree.get_children():
+        for key in visible: preview_tree.item(key, values=entry_values(preview_entries[key]))
+    else:
+        preview_tree.delete(*preview_tree.get_children())
+        for key in visible: preview_tree.insert("", tk.END, iid=key, values=entry_values(preview_entries[key]))
+    if total: preview_scrollbar.set(view_offset / total, (view_offset + len(visible)) / total)
+    else: preview_scrollbar.set(0, 1)
+    request_hydration(visible + [key for key in preview_tree.selection() if key not in visible])
+
+def scroll_view(action, amount, unit=None):
+    global view_offset
+    if action == "moveto": view_offset = int(float(amount) * len(preview_order))
+    else: view_offset += int(amount) * (view_rows if unit == "pages" else 1)
+    render_view()
+
+def on_mouse_wheel(event):
+    scroll_view("scroll", -3 if event.num == 4 or event.delta > 0 else 3, "units")
+    return "break"
+
+def on_tree_resize(event):
+    global view_rows
+    row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+    rows = max(1, (event.height - 25) // row_height)
+    if rows != view_rows: view_rows = rows; render_view()
 
 def toggle_check(event):
     if preview_tree.identify_region(event.x, event.y) == "cell" and preview_tree.identify_column(event.x) == '#1':
         item = preview_tree.identify_row(event.y)
         if item:
-            current_value = preview_tree.set(item, "check")
-            preview_tree.set(item, "check", "☑" if current_value == "☐" else "☐")
+            e = preview_entries[item]
+            set_checked(e, e.key not in checked_keys)
+            preview_tree.set(item, "check", "☑" if e.key in checked_keys else "☐")
             update_subtitle_controls()
 
 def refresh_history():
-    global download_history
     try:
-        if os.path.exists(HISTORY_FILE):
-            with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-                download_history = json.load(f)
-        else:
-            download_history = {}
-    except (IOError, json.JSONDecodeError) as e:
+        download_history = get_history_many(e.video_id for e in preview_entries.values())
+    except sqlite3.Error as e:
         log_message(f"Error refreshing history: {e}")
         return
 
-    for item_id in preview_tree.get_children():
-        values = list(preview_tree.item(item_id, "values"))
-        video_id = values[5]
-        if video_id in download_history:
-            values[4] = download_history[video_id]
-            preview_tree.item(item_id, values=values)
+    for e in preview_entries.values():
+        if e.video_id in download_history: e.last_download = download_history[e.video_id]
+    sort_cache.pop("last_download", None)
+    render_view()
     log_message("History refreshed.")
 
 def select_all():
-    for item in preview_tree.get_children(): preview_tree.set(item, "check", "☑")
-    update_subtitle_controls()
+    checked_keys.update(preview_entries); checked_sub_langs.clear(); checked_sub_langs.update(all_sub_langs)
+    render_view(); update_subtitle_controls()
 def deselect_all():
-    for item in preview_tree.get_children(): preview_tree.set(item, "check", "☐")
-    update_subtitle_controls()
-def on_tree_selection_change(event): update_subtitle_controls()
+    checked_keys.clear(); checked_sub_langs.clear()
+    render_view(); update_subtitle_controls()
+def on_tree_selection_change(event):
+    update_subtitle_controls(); request_hydration(list(preview_tree.get_children()) + list(preview_tree.selection()))
 
 def update_subtitle_controls():
     if preview_tree is None: return
 
-    selected_items = [i for i in preview_tree.get_children() if preview_tree.set(i, "check") == "☑"]
-    all_sub_langs, has_subtitles = set(), False
-    for item_id in selected_items:
-        values = preview_tree.item(item_id, "values"); sub_langs_json = values[9]
-        if sub_langs_json:
-            try:
-                langs = json.loads(sub_langs_json)
-                if langs: has_subtitles = True; all_sub_langs.update(langs)
-            except json.JSONDecodeError: pass
-    
+    has_subtitles = bool(checked_sub_langs)
     is_subtitle_mode = download_type_var.get() == "subtitle"
     
     if has_subtitles:
         subtitle_lang_combo.config(state="readonly")
-        lang_values = ["all"] + sorted(list(all_sub_langs))
+        lang_values = ["all"] + sorted(checked_sub_langs)
         subtitle_lang_combo["values"] = lang_values
         current_lang = config["subtitle_language"]
         if current_lang in lang_values: subtitle_lang_combo.set(current_lang)
@@ -350,7 +974,12 @@ def save_limit_settings():
             "download_subtitles_enabled": download_subtitles_var.get(),
             "subtitle_language": subtitle_lang_combo.get(),
             "add_track_number": add_track_number_var.get(),
-            "playlist_limit": int(playlist_limit_spin.get()) 
+            "playlist_limit": int(playlist_limit_spin.get()),
+            "parallel_downloads": max(1, int(parallel_spin.get())),
+            "bandwidth_limit_kbs": max(0, int(bandwidth_spin.get())),
+            "concurrent_fragments": max(1, int(fragments_spin.get())),
+            "overwrite_policy": overwrite_combo.get().lower(),
+            "queue_order": queue_order_key()
         })
         save_config() 
         log_message("Configuration saved successfully!")
@@ -366,258 +995,1105 @@ def update_format_combobox_visibility(*args):
     
     update_subtitle_controls()
 
-def ask_overwrite(filepath):
-    result, apply_to_all = "replace", False
-    top = tk.Toplevel(root); top.title("File Exists"); top.geometry("350x150"); top.grab_set()
-    tk.Label(top, text=f"File already exists:\n{os.path.basename(filepath)}", wraplength=330).pack(pady=5)
-    apply_to_all_var = tk.BooleanVar()
-    tk.Checkbutton(top, text="Apply to all", variable=apply_to_all_var).pack()
-    def on_choice(choice): nonlocal result, apply_to_all; result = choice; apply_to_all = apply_to_all_var.get(); top.destroy()
-    btn_frame = tk.Frame(top); btn_frame.pack(pady=5)
-    tk.Button(btn_frame, text="Skip", command=lambda: on_choice("skip")).pack(side="left", padx=5)
-    tk.Button(btn_frame, text="Replace", command=lambda: on_choice("replace")).pack(side="left", padx=5)
-    root.wait_window(top)
-    return result, apply_to_all
+def plan_overwrite(jobs, options):
+    # Runs before the batch starts: flags existing files in the preview and settles the policy, so no dialog ever opens mid-run
+    existing = plan_outputs(jobs, options)
+    existing_keys = [job["key"] for job, path in zip(jobs, existing) if path]
+    for job, path in zip(jobs, existing):
+        e = preview_entries.get(job["key"])
+        if path: set_entry_status(job["key"], "Exists")
+        elif e is not None and e.status == "Exists": set_entry_status(job["key"], "")  # flagged by an earlier plan, since removed
+    if not existing_keys or options["overwrite"] != "ask": return options["overwrite"]
+    answer = messagebox.askyesnocancel("Files Exist", f"{len(existing_keys)} of {len(jobs)} selected items already exist in the download folder.\n\nYes: skip them\nNo: replace them\nCancel: don't start")
+    return None if answer is None else "skip" if answer else "replace"
 
 def start_download_thread():
-    global download_thread; download_btn.config(state="disabled"); cancel_btn.config(state="normal")
-    cancel_event.clear(); download_thread = threading.Thread(target=download); download_thread.start()
+    jobs, options = collect_download_jobs()
+    if not jobs: return log_message("Please select items to download.")
+    options["overwrite"] = plan_overwrite(jobs, options)
+    if options["overwrite"] is None: return log_message("Download not started.")
+    start_download([{"jobs": enqueue_jobs(jobs, options), "options": options}])
+
+def serve_to_workers():
+    # The checked items are handed to worker processes instead of downloading here; results land in this history
+    global coordinator
+    jobs, options = collect_download_jobs()
+    if not jobs: return log_message("Please select items to serve.")
+    options["overwrite"] = plan_overwrite(jobs, options)
+    if options["overwrite"] is None: return log_message("Serving not started.")
+    if coordinator is None:
+        try: coordinator = start_coordinator(config.get("coordinator_host", "127.0.0.1"), int(config.get("coordinator_port", 8770)), config.get("coordinator_token", ""), on_engine_event)
+        except OSError as e: return log_message(f"Could not start the coordinator: {e}")
+        host, port = coordinator.server_address[:2]
+        log_message(f"Coordinator listening on http://{host}:{port} - run workers with: {os.path.basename(sys.argv[0])} --worker http://{host}:{port} --path <folder>")
+    jobs = enqueue_jobs(jobs, options)
+    mark_queued(jobs)
+    coordinator.add_jobs(jobs)
+    log_message(f"Serving {len(jobs)} items to workers.")
+
+def mark_queued(jobs):
+    # Rows plan_overwrite() flagged keep "Exists" until their item actually starts
+    for job in jobs:
+        e = preview_entries.get(job["key"])
+        if e is not None and e.status != "Exists": set_entry_status(job["key"], "Queued")
+
+def start_download(batches):
+    global download_thread
+    download_btn.config(state="disabled"); cancel_btn.config(state="normal")
+    progress_var.set(0)
+    for batch in batches: mark_queued(batch["jobs"])
+    cancel_event.clear(); download_thread = threading.Thread(target=download, args=(batches,), daemon=True); download_thread.start()
 
 def cancel_download():
-    global download_thread; log_message("Cancelling..."); cancel_event.set()
-    if download_thread and download_thread.is_alive(): download_thread.join()
-    download_btn.config(state="normal"); cancel_btn.config(state="disabled"); log_message("Download cancelled.")
+    # Never blocks the event loop: running items abort from their hooks, ffmpeg children are killed, finish_download() re-enables the UI
+    log_message("Cancelling..."); cancel_event.set(); cancel_btn.config(state="disabled")
+
+def offer_resume():
+    try: batches = load_unfinished_jobs()
+    except sqlite3.Error as e: return log_message(f"Error reading job queue: {e}")
+    if not batches: return
+    count, since = sum(len(b["jobs"]) for b in batches), datetime.fromtimestamp(batches[0]["created"]).strftime("%Y-%m-%d %H:%M")
+    answer = messagebox.askyesnocancel("Resume Downloads", f"{count} unfinished item(s) since {since} are still queued.\n\nYes: resume now\nNo: discard them\nCancel: keep them for later")
+    if answer is None: return
+    if not answer: prune_job_queue([b["batch_id"] for b in batches]); return log_message(f"Discarded {count} queued item(s).")
+    restore_preview(batches)
+    log_message(f"Resuming {count} queued item(s)...")
+    start_download(batches)
+
+def sync_saved_urls(auto=False):
+    # New uploads only: each saved URL is walked until the first downloaded video, and what's new is downloaded right away
+    urls = config.get("url_history", [])
+    if not urls: return log_message("Error: No saved URLs to sync.")
+    if sync_blocked(): return schedule_sync() if auto else None
+    options = download_options()
+    if options["overwrite"] == "ask": options["overwrite"] = "skip"  # nobody may be there to answer
+    try: limit_count = int(playlist_limit_spin.get())
+    except ValueError: limit_count = 0
+    log_message(f"Syncing {len(urls)} saved URLs...")
+    def task():
+        try: jobs = sync_sources(urls, limit_count)
+        except Exception as e: jobs = []; log_message(f"Critical error during sync: {e}")
+        run_on_ui(start_sync_download, jobs, options, auto)
+    threading.Thread(target=task, daemon=True).start()
+
+def sync_blocked():
+    if download_thread is not None and download_thread.is_alive(): log_message("Sync skipped: a download is still running."); return True
+    if loading_animation_id is not None: log_message("Sync skipped: an analysis is still running."); return True
+    return False
+
+def start_sync_download(jobs, options, auto):
+    global synced_preview
+    if auto: schedule_sync()
+    if not jobs or sync_blocked(): return
+    if auto and preview_entries and not synced_preview:
+        # The preview is the user's own Analyze (maybe mid-selection): keep it, the new uploads download without rows
+        jobs = [dict(job, key=f"sync{index}") for index, job in enumerate(jobs, start=1)]
+        log_message(f"Sync found {len(jobs)} new item(s); downloading them without replacing the preview.")
+    else: restore_preview([{"jobs": jobs}]); synced_preview = True
+    start_download([{"jobs": enqueue_jobs(jobs, options), "options": options}])
+
+def schedule_sync():
+    global sync_timer_id
+    minutes = float(config.get("sync_interval_minutes", 0) or 0)
+    if sync_timer_id is not None: root.after_cancel(sync_timer_id); sync_timer_id = None
+    if minutes > 0: sync_timer_id = root.after(int(minutes * 60000), lambda: sync_saved_urls(auto=True))
+
+def restore_preview(batches):
+    # Rebuilds the rows from the stored jobs instead of re-analyzing
+    clear_preview()
+    jobs = [job for batch in batches for job in batch["jobs"]]
+    history = get_history_many(job["video_id"] for job in jobs)
+    for index, job in enumerate(jobs, start=1):
+        entry = {"id": job["video_id"], "title": job["title"], "webpage_url": job["url"], "playlist_index": job["playlist_index"], "thumbnail": job.get("thumbnail"),
+                 "duration": job.get("duration")}
+        add_preview_item(index, entry, job["content_type"], job["playlist_title"], job["channel_name"], history).links = list(job.get("links") or [])
+        job["key"] = f"item{index}"
+    render_view()
 
 def toggle_check_with_space(event):
     for item_id in preview_tree.selection():
-        current_value = preview_tree.set(item_id, "check")
-        preview_tree.set(item_id, "check", "☑" if current_value == "☐" else "☐")
+        e = preview_entries[item_id]
+        set_checked(e, e.key not in checked_keys)
+        preview_tree.set(item_id, "check", "☑" if e.key in checked_keys else "☐")
     update_subtitle_controls()
 
 def select_undownloaded():
-    for item_id in preview_tree.get_children():
-        values = preview_tree.item(item_id, "values")
-        last_download_status = values[4]
-        if last_download_status == "Not Downloaded":
-            preview_tree.set(item_id, "check", "☑")
-    update_subtitle_controls()
+    for e in preview_entries.values():
+        if e.last_download == "Not Downloaded": set_checked(e, True)
+    render_view(); update_subtitle_controls()
 
 
-def download():
-    download_type = download_type_var.get()
-    
-    target_ext = ""
-    if download_type == "video": target_ext = video_format_combo.get()
-    elif download_type == "audio": target_ext = audio_format_combo.get()
-    elif download_type == "subtitle": target_ext = "srt"
+def download(batches):
+    try:
+        for batch in batches:
+            if cancel_event.is_set(): break
+            run_jobs(batch["jobs"], batch["options"], on_event=on_engine_event, cancel=cancel_event)
+    finally:
+        run_on_ui(finish_download)
+
+def finish_download():
+    download_btn.config(state="normal"); cancel_btn.config(state="disabled")
+    if cancel_event.is_set(): log_message("Download cancelled. Unfinished items stay queued for resume.")
+    refresh_history()
+
+def queue_order_key():
+    return next((key for key, label in QUEUE_ORDERS.items() if label == order_combo.get()), "listed")
+
+def collect_download_jobs():
+    checked_items = [key for key in preview_order if key in checked_keys]
+    return [preview_entries[key].job() for key in checked_items], download_options()
+
+def download_options():
+    try: workers, bandwidth, fragments = max(1, int(parallel_spin.get())), max(0, int(bandwidth_spin.get())), max(1, int(fragments_spin.get()))
+    except ValueError: workers, bandwidth, fragments = 1, 0, 1
+    return default_options(
+        download_type=download_type_var.get(), video_format=video_format_combo.get(), audio_format=audio_format_combo.get(),
+        cover_format=cover_format_combo.get(), download_path=download_path_entry.get().strip(), video_limit=video_limit_combo.get(),
+        audio_quality=audio_quality_combo.get(), embed_thumbnail=embed_thumbnail_var.get(), add_track_number=add_track_number_var.get(),
+        download_subtitles=download_subtitles_var.get(), subtitle_language=subtitle_lang_combo.get(), parallel_downloads=workers,
+        overwrite=overwrite_combo.get().lower(), order=queue_order_key(),
+        bandwidth_limit_kbs=bandwidth, concurrent_fragments=fragments)
+
+def on_engine_event(kind, **data):
+    # Runs on worker threads: everything goes through the UI event queue
+    if kind == "log": log_message(data["message"])
+    elif kind == "progress": post_ui("progress", data["key"], data["status"] or f"{data['percent']:.0f}%")
+    elif kind == "overall": post_ui("overall", data["percent"])
+    elif kind == "stats": run_on_ui(update_stats, data["stats"])
+    elif kind == "eta": run_on_ui(eta_var.set, format_eta_status(data))
+
+def update_stats(stats):
+    global last_stats
+    last_stats = stats
+    if stats_window is not None and stats_window.winfo_exists(): show_stats()
+
+def show_stats():
+    global stats_window
+    if stats_window is None or not stats_window.winfo_exists():
+        stats_window = tk.Toplevel(root); stats_window.title("Batch Stats"); stats_window.geometry("420x260")
+        tree = ttk.Treeview(stats_window, columns=("phase", "count", "p50", "p95", "total"), show="headings")
+        for col, text, width in (("phase", "Phase", 120), ("count", "Items", 60), ("p50", "p50", 70), ("p95", "p95", 70), ("total", "Total", 80)):
+            tree.heading(col, text=text); tree.column(col, width=width, anchor="w" if col == "phase" else "e")
+        tree.pack(fill="both", expand=True, padx=5, pady=5)
+        stats_window.tree = tree
+    tree = stats_window.tree
+    tree.delete(*tree.get_children())
+    for phase, s in last_stats.items(): tree.insert("", tk.END, values=(phase, s["count"], f"{s['p50_s']:.2f}s", f"{s['p95_s']:.2f}s", f"{s['total_s']:.1f}s"))
+    if not last_stats: tree.insert("", tk.END, values=("(no finished batch yet)", "", "", "", ""))
+
+# --- Download Engine ---
+def default_options(**overrides):
+    options = {
+        "download_type": config.get("download_type", "video"), "video_format": config["video_format"],
+        "audio_format": config["audio_format"], "cover_format": config["cover_format"],
+        "download_path": config["download_path"], "video_limit": config["video_limit"], "audio_quality": config["audio_quality"],
+        "embed_thumbnail": config["embed_thumbnail"], "add_track_number": config["add_track_number"],
+        "download_subtitles": config["download_subtitles_enabled"], "subtitle_language": config["subtitle_language"],
+        "parallel_downloads": config["parallel_downloads"], "overwrite": config.get("overwrite_policy", "ask"), "metrics_file": config.get("metrics_file", ""),
+        "bandwidth_limit_kbs": config.get("bandwidth_limit_kbs", 0), "concurrent_fragments": config.get("concurrent_fragments", 4),
+        "shared_store": config.get("shared_store", True), "order": config.get("queue_order", "listed"),
+        "single_pass": config.get("single_pass_mux", True),
+    }
+    options.update({k: v for k, v in overrides.items() if v is not None})
+    return options
+
+def make_job(entry, content_type, playlist_title="", channel_name=""):
+    return {"url": entry.get("webpage_url") or entry.get("url") or "N/A", "title": sanitize_filename(entry.get("title") or "Unknown"),
+            "video_id": entry.get("id", ""), "content_type": content_type, "playlist_title": playlist_title,
+            "channel_name": channel_name, "playlist_index": entry.get("playlist_index") or "", "thumbnail": entry.get("thumbnail") or "",
+            "duration": entry.get("duration")}
+
+def link_fields(job):
+    return {k: job.get(k, "") for k in ("content_type", "playlist_title", "channel_name", "playlist_index")}
+
+def merge_link(links, first, job):
+    link = link_fields(job)
+    if link != link_fields(first) and link not in links: links.append(link)
+
+def dedupe_jobs(jobs):
+    # One job per video_id; later appearances (other playlists or channels) become link targets of the first
+    merged, first_by_id = [], {}
+    for job in jobs:
+        first = first_by_id.get(job.get("video_id")) if job.get("video_id") else None
+        if first is None:
+            merged.append(job)
+            if job.get("video_id"): first_by_id[job["video_id"]] = job
+        else: merge_link(first.setdefault("links", []), first, job)
+    return merged
+
+# --- Scheduler ---
+def schedule_jobs(jobs, options):
+    # Orders the batch by options["order"]; returns (jobs, estimated bytes per job, whether any size was known)
+    entries = cache_get_videos(job["video_id"] for job in jobs if job.get("video_id"))
+    estimates = [estimate_bytes(job, entries.get(job.get("video_id")) or {}, options) for job in jobs]
+    known = [size for size in estimates if size]
+    fallback = sum(known) // len(known) if known else 1
+    estimates = [size or fallback for size in estimates]
+    order, policy = list(range(len(jobs))), options.get("order")
+    if policy == "shortest": order.sort(key=lambda i: jobs[i].get("duration") if jobs[i].get("duration") is not None else float("inf"))
+    elif policy == "largest": order.sort(key=lambda i: -estimates[i])
+    elif policy == "channel":
+        # Round-robin over channels so no single channel (or its rate limit) holds up the rest
+        by_channel = {}
+        for i in order: by_channel.setdefault(jobs[i].get("channel_name") or "", []).append(i)
+        order = [i for group in itertools.zip_longest(*by_channel.values()) for i in group if i is not None]
+    return [jobs[i] for i in order], [estimates[i] for i in order], bool(known)
+
+def estimate_bytes(job, entry, options):
+    # Analyzed formats when known (size, approximate size or bitrate × duration), else a typical bitrate; None if nothing to go on
+    download_type, duration = options["download_type"], job.get("duration") or entry.get("duration")
+    if download_type in TYPICAL_BYTES: return TYPICAL_BYTES[download_type]
+    size = lambda f: f.get("filesize") or f.get("filesize_approx") or (int(f["tbr"] * 125 * duration) if f.get("tbr") and duration else 0)
+    formats = entry.get("formats") or []
+    audio = max((size(f) for f in formats if f.get("vcodec") == "none" and f.get("acodec") != "none"), default=0)
+    if download_type == "video":
+        limit = int(options["video_limit"].rstrip("p") or 0)
+        videos = [f for f in formats if f.get("height") and f["height"] <= limit and f.get("vcodec") != "none"]
+        top = max((f["height"] for f in videos), default=0)
+        video = max((size(f) for f in videos if f["height"] == top), default=0)
+        if video: return video + audio
+        kbps = next(rate for height, rate in TYPICAL_VIDEO_KBPS.items() if height <= limit) + TYPICAL_AUDIO_KBPS
+    else:
+        if audio: return audio
+        kbps = TYPICAL_AUDIO_KBPS
+    return int(kbps * 125 * duration) if duration else None
+
+def format_bytes(count):
+    for unit in ("B", "KB", "MB", "GB"):
+        if count < 1024: return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+    return f"{count:.1f} TB"
+
+def format_eta(seconds):
+    minutes, seconds = divmod(int(seconds), 60); hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def format_eta_status(data):
+    eta = "ETA --" if data["eta_s"] is None else f"ETA {format_eta(data['eta_s'])}"
+    return f"{eta} · {format_bytes(data['rate_bps'])}/s · {data['finished']}/{data['total']}"
+
+def run_jobs(jobs, options, on_event=None, cancel=None):
+    # GUI-free: returns one result dict per job and reports through on_event(kind, **data)
+    emit = on_event or (lambda kind, **data: None)
+    import_yt_dlp()
+    target_ext = target_extension(options)
+    jobs, estimates, sized = schedule_jobs(jobs, options)
     
     ffmpeg_exe_path = 'ffmpeg'
-    ydl_opts = {}
+    base_opts = {}
 
     if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
         ffmpeg_exe_path = os.path.join(sys._MEIPASS, 'ffmpeg.exe')
-        ydl_opts['ffmpeg_location'] = sys._MEIPASS
+        base_opts['ffmpeg_location'] = sys._MEIPASS
 
-    needs_ffmpeg = target_ext in ["mp3", "mkv", "srt"]
+    needs_ffmpeg = target_ext in ["mp3", "mkv", "srt"] or (options.get("single_pass") and (options["download_type"] == "video" or target_ext == "m4a"))
     if needs_ffmpeg and not shutil.which(ffmpeg_exe_path.replace('.exe','')):
-        log_message(f"Warning: ffmpeg not found! Conversion might fail.")
+        emit("log", message="Warning: ffmpeg not found! Conversion might fail.")
+
+    workers = max(1, int(options.get("parallel_downloads") or 1))
+    # Covers with a known thumbnail URL are a single small GET each, so they get a wider pool
+    if options["download_type"] == "cover": workers = max(workers, int(config.get("cover_workers", 16)))
+    elif options["download_type"] == "subtitle": workers = max(workers, int(config.get("subtitle_workers", 8)))
+    # Single pass: yt-dlp only downloads the streams, one ffmpeg run writes the final file (see mux_command)
+    split_streams = bool(options.get("single_pass")) and (options["download_type"] == "video" or (options["download_type"] == "audio" and target_ext != "mp3"))
+    ydl_opts, temp_ext = build_ydl_opts(options, base_opts, target_ext, split_streams)
+    batch = {
+        "options": options, "emit": emit, "cancel": cancel or threading.Event(),
+        "target_ext": target_ext, "temp_ext": temp_ext, "split_streams": split_streams, "ffmpeg_exe_path": ffmpeg_exe_path, "ydl_opts": ydl_opts, "total": len(jobs),
+        "session_local": threading.local(), "sessions": [],
+        "existing": plan_outputs(jobs, options), "progress_lock": threading.Lock(), "progress": {}, "progress_sum": 0, "pending": [],
+        "started": time.perf_counter(), "metrics_lock": threading.Lock(), "bytes_seen": {}, "covers": [],
+        "weights": {job.get("key", idx): size for idx, (job, size) in enumerate(zip(jobs, estimates), start=1)},
+        "weight_total": sum(estimates), "bytes_moved": 0, "finished": 0, "eta_reported": 0,
+        "bucket": TokenBucket(int(options["bandwidth_limit_kbs"]) * 1024) if options.get("bandwidth_limit_kbs") else None,
+        "transcode_pool": ThreadPoolExecutor(max_workers=int(options.get("transcode_workers") or os.cpu_count() or 2), thread_name_prefix="transcode"),
+    }
+    if workers > 1 and len(jobs) > 1: emit("log", message=f"Starting {len(jobs)} items with {workers} parallel downloads.")
+    if batch["bucket"]: emit("log", message=f"Bandwidth limited to {options['bandwidth_limit_kbs']} KB/s across all downloads.")
+    if jobs and (sized or options.get("order", "listed") != "listed"):
+        emit("log", message=f"Order: {QUEUE_ORDERS.get(options.get('order'), QUEUE_ORDERS['listed']).lower()}" + (f", about {format_bytes(sum(estimates))} to fetch." if sized else "."))
+    existing_count = sum(1 for path in batch["existing"] if path)
+    if existing_count: emit("log", message=f"{existing_count} of {len(jobs)} items already exist and will be {'replaced' if options.get('overwrite') == 'replace' else 'skipped'}.")
 
-    checked_items = [i for i in preview_tree.get_children() if preview_tree.set(i, "check") == "☑"]
-    if not checked_items: return log_message("Please select items to download.")
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            try: results = list(pool.map(run_job, range(1, len(jobs) + 1), jobs, itertools.repeat(batch)))
+            except BaseException: batch["cancel"].set(); raise
+    finally:
+        close_sessions(batch)
+    if batch["covers"]: convert_covers(batch)
+    with batch["transcode_pool"]:
+        for future in batch["pending"]: future.exception()
+    if any(job.get("job_id") for job in jobs): prune_job_queue()
+
+    stats = summarize_metrics(results)
+    if stats:
+        emit("stats", stats=stats)
+        emit("log", message=f"Phase times p50/p95: {format_stats(stats)}")
+    report_eta(batch, force=True)
+    if not batch["cancel"].is_set(): emit("log", message="All tasks finished.")
+    return results
+
+def run_job(idx, job, batch):
+    result = {"key": job.get("key", idx), "job_id": job.get("job_id"), "video_id": job.get("video_id", ""), "title": job.get("title", ""), "status": "cancelled", "path": None,
+              "links": job.get("links") or []}
+    now = time.perf_counter()
+    result["metrics"] = {"queue_wait_s": round(now - batch["started"], 4), "spans": {}, "bytes": 0, "open": {}, "started": now}
+    if batch["cancel"].is_set(): return finish_job(batch, result)
+    set_job_state(result["job_id"], "downloading")
+    try:
+        if process_item(idx, job, batch, result): return result
+    except Exception as e:
+        batch["emit"]("log", message=f"Error processing '{result['title']}': {e}")
+        result.update(status="failed", error=str(e))
+    return finish_job(batch, result)
+
+def finish_job(batch, result):
+    close_metrics(batch, result)
+    if result["status"] in ("done", "skipped"): publish_output(batch, result)
+    with batch["progress_lock"]:
+        batch["finished"] += 1
+        # Skipped/failed items took no transfer time; keeping their weight would make the ETA optimistic
+        if result["status"] != "done": discount_weight(batch, result["key"])
+    status_text = {"done": "Done", "skipped": "Skipped", "failed": "Failed", "cancelled": "Cancelled"}[result["status"]]
+    set_job_progress(batch, result["key"], 100, status_text)
+    set_job_state(result["job_id"], {"done": "done", "skipped": "done", "failed": "failed", "cancelled": "queued"}[result["status"]], error=result.get("error"))
+    batch["emit"]("item_done", result=result)
+    return result
+
+def set_job_progress(batch, key, percent, status=None):
+    # Overall progress is weighted by each item's estimated size, so one long video counts for more than a short clip
+    with batch["progress_lock"]:
+        weight = batch["weights"].get(key, 0)
+        batch["progress_sum"] += (percent - batch["progress"].get(key, 0)) * weight
+        batch["progress"][key] = percent
+        overall = batch["progress_sum"] / batch["weight_total"] if batch["weight_total"] else 100
+    batch["emit"]("progress", key=key, percent=percent, status=status)
+    batch["emit"]("overall", percent=overall)
+    report_eta(batch)
+
+def discount_weight(batch, key):
+    # Caller holds progress_lock
+    weight = batch["weights"].pop(key, 0)
+    batch["progress_sum"] -= batch["progress"].get(key, 0) * weight
+    batch["weight_total"] -= weight
+
+def report_eta(batch, force=False):
+    # Whole-batch ETA from the measured pace: elapsed time per unit of (size-weighted) progress
+    now = time.perf_counter()
+    with batch["progress_lock"]:
+        if not force and now - batch["eta_reported"] < ETA_REPORT_S: return
+        batch["eta_reported"] = now
+        done, total, moved, finished = batch["progress_sum"] / 100, batch["weight_total"], batch["bytes_moved"], batch["finished"]
+    elapsed = now - batch["started"]
+    eta = elapsed * (total - done) / done if done > 0 and total > done else (0 if done >= total else None)
+    batch["emit"]("eta", eta_s=None if eta is None else round(eta, 1), rate_bps=round(moved / elapsed) if elapsed > 0 else 0,
+                  finished=finished, total=batch["total"])
+
+def moved_bytes(batch, result, count):
+    result["metrics"]["bytes"] += count
+    with batch["progress_lock"]: batch["bytes_moved"] += count
+    if batch["bucket"]: batch["bucket"].consume(count, batch["cancel"])
+
+def process_item(idx, job, batch, result):
+    options, emit = batch["options"], batch["emit"]
+    log = lambda msg: emit("log", message=msg)
+    download_type, target_ext, ffmpeg_exe_path = options["download_type"], batch["target_ext"], batch["ffmpeg_exe_path"]
+    url, title, video_id = job["url"], job.get("title") or job.get("video_id") or "Unknown", job.get("video_id", "")
+    channel_name = job.get("channel_name") or "Unknown Channel"
     
-    download_path, total = download_path_entry.get().strip(), len(checked_items)
-    overwrite_action = None
-
-    for idx, item in enumerate(checked_items, start=1):
-        if cancel_event.is_set(): break
-        values = preview_tree.item(item, "values")
-        (url, title, video_id, content_type, playlist_title, 
-         channel_name, playlist_index) = (values[1], values[2], values[5], values[6], 
-                                          values[7], values[8], values[10])
-        
-        if not url or url == "N/A": log_message(f"Skipping '{title}' (No URL)."); continue
-
-        # --- Folder Structure ---
-        sub_folder = playlist_title if content_type == "playlist_video" else "Videos"
-        final_download_path = os.path.join(download_path, channel_name, sub_folder)
-        if not os.path.exists(final_download_path): os.makedirs(final_download_path)
+    if not url or url == "N/A": log(f"Skipping '{title}' (No URL)."); return result.update(status="skipped")
+
+    # Existing outputs were found by plan_outputs() before the batch started; the policy was chosen up front
+    existing = batch["existing"][idx - 1]
+    if existing and options.get("overwrite") != "replace": log(f"Skipping: {title}"); return result.update(status="skipped", path=existing)
+
+    final_download_path, final_title = output_base(job, options)
+    os.makedirs(final_download_path, exist_ok=True)
+    base_outtmpl = os.path.join(final_download_path, final_title)
+
+    # Already fetched for another playlist (or an earlier batch): link it instead of downloading again
+    stored = store_path(options, video_id, target_ext)
+    if stored and os.path.exists(stored) and not existing:
+        final_filepath = f"{base_outtmpl}.{target_ext}"
+        link_output(stored, final_filepath); log(f"Linked from store: {final_filepath}")
+        if video_id: record_history(video_id)
+        return result.update(status="done", path=final_filepath)
+    
+    temp_ext = batch["temp_ext"]
+    log(f"⬇ ({idx}/{batch['total']}) Processing: {final_title}")
+    set_job_progress(batch, result["key"], 0)
+
+    if download_type == "cover" and job.get("thumbnail"):
+        data = fetch_thumbnail(batch, result, job["thumbnail"], log)
+        if data is not None: return save_cover(batch, result, data, base_outtmpl, log)
+        if batch["cancel"].is_set(): return
+        log(f"Falling back to yt-dlp for the cover of: {final_title}")
+
+    if download_type == "subtitle":
+        if fetch_subtitles(batch, result, job, base_outtmpl, log) or batch["cancel"].is_set(): return
+        log(f"Falling back to yt-dlp for the subtitles of: {final_title}")
+
+    transcode = job.get("transcode")
+    if transcode and os.path.exists(transcode["source"]):
+        log(f"Download already complete, resuming conversion.")
+        return submit_transcode(batch, result, transcode["cmd"], transcode["source"], transcode["final"], transcode["cleanup"], transcode.get("fallback", True))
+    
+    info, session = None, get_session(batch)
+    try:
+        session.result = result
+        apply_item_opts(session.ydl, item_ydl_opts(base_outtmpl, batch["split_streams"]))
+        start_span(result, "extract")
+        info = download_analyzed(session.ydl, url, video_id, log)
+    except DownloadCancelled:
+        log(f"Cancelled: {final_title} (partial file kept for resume)"); return
+    except Exception as e:
+        log(f"Warning processing '{final_title}': {e}")
+    finally:
+        end_span(result, "extract"); end_span(result, "download")
+    if batch["cancel"].is_set(): return
+    
+    if batch["split_streams"]:
+        streams = downloaded_filepaths(info)
+        if not streams: log(f"Warning: Primary file not found."); return result.update(status="failed", error="output file not found")
+        # yt-dlp records the thumbnail under the last stream's name, but writes it under the plain thumbnail template
+        thumbnail = downloaded_thumbnail(info) or next((path for path in (f"{base_outtmpl}.{ext}" for ext in ("jpg", "webp", "png")) if os.path.exists(path)), None)
+        if not options["embed_thumbnail"]: thumbnail = None
+        final_filepath = f"{base_outtmpl}.{target_ext}"
+        ffmpeg_cmd = mux_command(ffmpeg_exe_path, streams, thumbnail, final_filepath, options, info, title, channel_name)
+        return submit_transcode(batch, result, ffmpeg_cmd, streams[0], final_filepath, streams + [thumbnail], fallback=False)
+
+    if download_type == "audio" and target_ext == "mp3":
+        source = downloaded_filepath(info)
+        if not source: log(f"Warning: Primary file not found."); return result.update(status="failed", error="output file not found")
+        final_filepath = f"{base_outtmpl}.mp3"
+        if source == final_filepath: log(f"Saved to: {final_filepath}"); result["path"] = final_filepath
+        else:
+            thumbnail = downloaded_thumbnail(info) if options["embed_thumbnail"] else None
+            ffmpeg_cmd = mp3_encode_command(ffmpeg_exe_path, source, thumbnail, final_filepath, options["audio_quality"], title, channel_name)
+            return submit_transcode(batch, result, ffmpeg_cmd, source, final_filepath, [source, thumbnail])
 
-        final_title = title
-        if add_track_number_var.get() and content_type == "playlist_video" and playlist_index:
-            try: final_title = f"{int(playlist_index):02d} - {title}"
-            except (ValueError, TypeError): pass
+    elif download_type in ["video", "audio"]:
+        temp_filepath = f"{base_outtmpl}.{temp_ext}"
+        final_filepath = f"{base_outtmpl}.{target_ext}"
         
-        base_outtmpl = os.path.join(final_download_path, final_title)
-        
-        temp_ext = ""
-        log_message(f"⬇ ({idx}/{total}) Processing: {final_title}")
-        
-        ydl_opts.update({
-            "quiet": True, 
-            "progress_hooks": [progress_hook], 
-            "noplaylist": True, 
-            "outtmpl": base_outtmpl,
-            "extractor_args": {'youtube': ['player_client=default']}
-        })
-        
-        pps_common = []
-        if embed_thumbnail_var.get():
-             ydl_opts["writethumbnail"] = True
-             pps_common.append({'key': 'FFmpegThumbnailsConvertor', 'format': 'jpg'})
-             ydl_opts["addmetadata"] = True
+        if not os.path.exists(temp_filepath):
+             if os.path.exists(final_filepath):
+                 temp_filepath = final_filepath
+             else:
+                if os.path.exists(f"{base_outtmpl}.webm"): temp_filepath = f"{base_outtmpl}.webm"
+                else: log(f"Warning: Primary file not found (could be merged)."); return result.update(status="failed", error="output file not found")
 
-        should_download_sub = (download_type == "subtitle") or (download_subtitles_var.get())
+        if temp_ext != target_ext and target_ext == "mkv" and temp_filepath != final_filepath:
+            ffmpeg_cmd = [ffmpeg_exe_path, '-y', '-i', temp_filepath, '-codec', 'copy', final_filepath]
+            return submit_transcode(batch, result, ffmpeg_cmd, temp_filepath, final_filepath, [temp_filepath])
+        else:
+            if temp_filepath != final_filepath and os.path.exists(temp_filepath):
+                start_span(result, "rename"); os.rename(temp_filepath, final_filepath); end_span(result, "rename")
         
-        if should_download_sub:
-             selected_lang = subtitle_lang_combo.get()
-             ydl_opts.update({
-                 "writesubtitles": True,
-                 "writeautomaticsub": False,
-                 "subtitlesformat": "srt",
-                 "postprocessors": [{'key': 'FFmpegSubtitlesConvertor', 'format': 'srt'}]
-             })
-             if selected_lang and selected_lang != "all":
-                 ydl_opts['subtitleslangs'] = [selected_lang]
-             else:
-                 ydl_opts['subtitleslangs'] = ['all', '-live_chat']
+        log(f"Saved to: {final_filepath}")
+        result["path"] = final_filepath
+    
+    elif download_type == "subtitle":
+         log(f"Subtitle download requested.")
+         paths = {f".{code}.srt": f"{base_outtmpl}.{code}.srt" for code in ((info or {}).get("requested_subtitles") or {})}
+         paths = {suffix: path for suffix, path in paths.items() if os.path.exists(path)}
+         if paths: result.update(path=next(iter(paths.values())), paths=paths)
+    
+    elif download_type == "cover":
+         final_cover_path = f"{base_outtmpl}.{target_ext}"
+         if os.path.exists(final_cover_path):
+             log(f"Cover downloaded.")
+             result["path"] = final_cover_path
+         else:
+             log(f"Cover process finished.")
+
+    if video_id: record_history(video_id)
+    result["status"] = "done"
+
+def target_extension(options):
+    download_type = options["download_type"]
+    if download_type == "video": return options["video_format"]
+    elif download_type == "audio": return options["audio_format"]
+    elif download_type == "subtitle": return "srt"
+    elif download_type == "cover": return options["cover_format"]
+    return ""
+
+def output_base(job, options):
+    # <download path>/<channel>/<playlist or Videos>, file name without extension
+    channel_name, playlist_index = job.get("channel_name") or "Unknown Channel", job.get("playlist_index", "")
+    title = job.get("title") or job.get("video_id") or "Unknown"
+    sub_folder = job.get("playlist_title", "") if job.get("content_type") == "playlist_video" else "Videos"
+    final_title = title
+    if options["add_track_number"] and job.get("content_type") == "playlist_video" and playlist_index:
+        try: final_title = f"{int(playlist_index):02d} - {title}"
+        except (ValueError, TypeError): pass
+    return os.path.join(options["download_path"], channel_name, sub_folder), final_title
+
+def store_path(options, video_id, target_ext):
+    # Shared store keyed by video id and every setting that shapes the file: <download path>/.store/<id>.<type>[.<res|kbps>][.cover].<ext>
+    download_type = options["download_type"]
+    if not options.get("shared_store") or not video_id or download_type == "subtitle": return None
+    variant = [options["video_limit"]] if download_type == "video" else [re.sub(r"\D", "", options["audio_quality"]) + "k"] if download_type == "audio" else []
+    if download_type != "cover" and options.get("embed_thumbnail"): variant.append("cover")
+    return os.path.join(options["download_path"], ".store", ".".join([sanitize_filename(video_id), download_type, *variant, target_ext]))
+
+def link_output(source, target, replace=False, copy=True):
+    # Hardlink so the bytes are on disk once; copy when the filesystem can't (FAT/exFAT, another drive)
+    if os.path.exists(target):
+        if not replace or os.path.samefile(source, target): return False
+        os.remove(target)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try: os.link(source, target)
+    except OSError:
+        if not copy: return False
+        shutil.copy2(source, target)
+    return True
+
+def publish_output(batch, result):
+    # Puts the finished file in the store, then links it into every other playlist folder the video appeared in.
+    # A skipped file was made with unknown settings, so only what this batch produced goes into the store
+    options, path, log = batch["options"], result.get("path"), lambda msg: batch["emit"]("log", message=msg)
+    if not path or not os.path.exists(path): return
+    ext, replace = os.path.splitext(path)[1], options.get("overwrite") == "replace"
+    try:
+        stored = store_path(options, result["video_id"], ext[1:]) if ext and result["status"] == "done" else None
+        if stored: link_output(path, stored, replace=replace, copy=False)
+        # Several files per item (subtitles in more than one language) come as {suffix: path}
+        outputs = result.get("paths") or {ext: path}
+        for link in result["links"]:
+            folder, final_title = output_base(dict(link, title=result["title"], video_id=result["video_id"]), options)
+            for suffix, source in outputs.items():
+                target = os.path.join(folder, final_title + suffix)
+                if link_output(source, target, replace=replace): log(f"Linked: {target}")
+    except OSError as e: log(f"Warning linking '{result['title']}': {e}")
+
+def plan_outputs(jobs, options):
+    # One scandir per target folder instead of per-item os.path.exists calls; returns the existing final path or None per job
+    if options["download_type"] == "subtitle": return [None] * len(jobs)
+    target_ext, listings, existing = target_extension(options), {}, []
+    for job in jobs:
+        folder, final_title = output_base(job, options)
+        if folder not in listings:
+            try:
+                with os.scandir(folder) as it: listings[folder] = {os.path.normcase(entry.name) for entry in it}
+            except OSError: listings[folder] = set()
+        name = f"{final_title}.{target_ext}"
+        existing.append(os.path.join(folder, name) if os.path.normcase(name) in listings[folder] else None)
+    return existing
+
+def build_ydl_opts(options, base_opts, target_ext, split_streams=False):
+    # Built once per batch and never mutated afterwards; per-item values go through item_ydl_opts()
+    download_type, temp_ext = options["download_type"], ""
+    ydl_opts = dict(base_opts)
+    ydl_opts.update({
+        "quiet": True, 
+        "noprogress": True, 
+        "noplaylist": True, 
+        "continuedl": True, 
+        "concurrent_fragment_downloads": max(1, int(options.get("concurrent_fragments") or 1)),
+        "extractor_args": {'youtube': ['player_client=default']}
+    })
+    
+    pps_common, subtitle_pps = [], []
+    if options["embed_thumbnail"]:
+         ydl_opts["writethumbnail"] = True
+         pps_common.append({'key': 'FFmpegThumbnailsConvertor', 'format': 'jpg'})
+         ydl_opts["addmetadata"] = True
 
-        if download_type == "video":
-            temp_ext = "mp4"
-            height_limit = video_limit_combo.get().replace("p", "")
-            ydl_opts.update({"format": f"bestvideo[height<={height_limit}]+bestaudio/best[height<={height_limit}]", "merge_output_format": temp_ext})
-            
-            if embed_thumbnail_var.get():
-                pps_common.append({'key': 'EmbedThumbnail'})
-                pps_common.append({'key': 'FFmpegMetadata'})
-            
-            if pps_common:
-                ydl_opts.update({"postprocessors": pps_common})
-
-        elif download_type == "audio":
-            temp_ext = "m4a"
-            audio_pps = []
-            if embed_thumbnail_var.get():
-                audio_pps.extend(pps_common)
-                audio_pps.append({'key': 'EmbedThumbnail'})
-                
-            audio_pps.append({'key': 'FFmpegExtractAudio', 'preferredcodec': temp_ext})
-            
-            if embed_thumbnail_var.get():
-                audio_pps.append({'key': 'FFmpegMetadata'})
-                
-            ydl_opts.update({"format": "bestaudio/best", "postprocessors": audio_pps})
-
-
-        elif download_type == "cover":
-            target_ext, temp_ext = cover_format_combo.get(), cover_format_combo.get()
-            ydl_opts.update({
-                "writethumbnail": True, 
-                "skip_download": True, 
-                "ignoreerrors": True, 
-                "postprocessors": [{'key': 'FFmpegThumbnailsConvertor', 'format': temp_ext}]
-            })
+    if options.get("bandwidth_limit_kbs"):
+        # Per-download ceiling so yt-dlp sizes its read blocks for the budget; the shared TokenBucket does the rest
+        ydl_opts["ratelimit"] = int(options["bandwidth_limit_kbs"]) * 1024
+
+    should_download_sub = (download_type == "subtitle") or options["download_subtitles"]
+    
+    if should_download_sub:
+         selected_lang = options["subtitle_language"]
+         ydl_opts.update({
+             "writesubtitles": True,
+             "writeautomaticsub": False,
+             "subtitlesformat": "srt",
+         })
+         subtitle_pps = [{'key': 'FFmpegSubtitlesConvertor', 'format': 'srt'}]
+         if selected_lang and selected_lang != "all":
+             ydl_opts['subtitleslangs'] = [selected_lang]
+         else:
+             ydl_opts['subtitleslangs'] = ['all', '-live_chat']
+
+    if split_streams:
+        # Separate stream files ("," instead of "+" keeps yt-dlp's merger out); no fixups, tags or cover
+        # passes either, each of those would rewrite the whole file
+        temp_ext = None
+        height_limit = options["video_limit"].replace("p", "")
+        stream_format = f"(bv*[height<={height_limit}],ba)/b[height<={height_limit}]" if download_type == "video" else "bestaudio[ext=m4a]/bestaudio/best"
+        ydl_opts.update({"format": stream_format, "postprocessors": subtitle_pps, "addmetadata": False, "fixup": "never"})
+
+    elif download_type == "video":
+        temp_ext = "mp4"
+        height_limit = options["video_limit"].replace("p", "")
+        ydl_opts.update({"format": f"bestvideo[height<={height_limit}]+bestaudio/best[height<={height_limit}]", "merge_output_format": temp_ext})
         
-        elif download_type == "subtitle":
-            ydl_opts.update({"skip_download": True})
-            target_ext = "srt"
-            temp_ext = "srt"
-
-        check_filepath = f"{base_outtmpl}.{target_ext}"
-        if download_type == "subtitle":
-             lang_code = subtitle_lang_combo.get()
-             possible_sub = f"{base_outtmpl}.{lang_code}.srt"
-             if os.path.exists(possible_sub): check_filepath = possible_sub
-
-        if os.path.exists(check_filepath) and download_type != "subtitle":
-             choice = overwrite_action
-             if choice is None:
-                 choice, apply_to_all = ask_overwrite(check_filepath)
-                 if apply_to_all: overwrite_action = choice
-             if choice == "skip": log_message(f"Skipping: {title}"); continue
-             elif choice != "replace": log_message("Cancelled."); break
+        if options["embed_thumbnail"]:
+            pps_common.append({'key': 'EmbedThumbnail'})
+            pps_common.append({'key': 'FFmpegMetadata'})
         
-        try:
-            with YoutubeDL(ydl_opts) as ydl: ydl.download([url])
-        except Exception as e:
-            log_message(f"Warning processing '{final_title}': {e}")
-        
-        if download_type in ["video", "audio"]:
-            temp_filepath = f"{base_outtmpl}.{temp_ext}"
-            final_filepath = f"{base_outtmpl}.{target_ext}"
-            
-            if not os.path.exists(temp_filepath):
-                 if os.path.exists(final_filepath):
-                     temp_filepath = final_filepath
-                 else:
-                    if os.path.exists(f"{base_outtmpl}.webm"): temp_filepath = f"{base_outtmpl}.webm"
-                    else: log_message(f"Warning: Primary file not found (could be merged)."); continue
-
-            if temp_ext != target_ext:
-                log_message(f"Converting {temp_ext} to {target_ext}...")
-                ffmpeg_cmd = []
-                if target_ext == "mkv":
-                    ffmpeg_cmd = [ffmpeg_exe_path, '-y', '-i', temp_filepath, '-codec', 'copy', final_filepath]
-                elif target_ext == "mp3":
-                    quality_str = audio_quality_combo.get()
-                    bitrate = re.search(r'(\d+)', quality_str).group(1) if re.search(r'(\d+)', quality_str) else "192"
-                    ffmpeg_cmd = [ffmpeg_exe_path, '-y', '-i', temp_filepath, '-vn', '-codec:a', 'libmp3lame', '-b:a', f'{bitrate}k', final_filepath]
-
-                if ffmpeg_cmd:
-                    try:
-                        startupinfo = None
-                        if platform.system() == "Windows":
-                            startupinfo = subprocess.STARTUPINFO(); startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                        subprocess.run(ffmpeg_cmd, check=True, startupinfo=startupinfo, capture_output=True)
-                        log_message(f"Conversion successful.")
-                        if os.path.exists(temp_filepath) and temp_filepath != final_filepath:
-                             os.remove(temp_filepath)
-                    except (subprocess.CalledProcessError, FileNotFoundError) as e:
-                        log_message(f"FFmpeg conversion failed! Keeping original format.")
-            else:
-                if temp_filepath != final_filepath and os.path.exists(temp_filepath):
-                    os.rename(temp_filepath, final_filepath)
+        ydl_opts["postprocessors"] = pps_common + subtitle_pps
+
+    elif download_type == "audio" and target_ext == "mp3":
+        # Raw best audio only; the transcode queue encodes mp3, cover and tags in one ffmpeg pass
+        temp_ext = None
+        ydl_opts.update({"format": "bestaudio/best", "postprocessors": subtitle_pps, "addmetadata": False})
+
+    elif download_type == "audio":
+        temp_ext = "m4a"
+        audio_pps = []
+        if options["embed_thumbnail"]:
+            audio_pps.extend(pps_common)
+            audio_pps.append({'key': 'EmbedThumbnail'})
             
-            log_message(f"Saved to: {final_filepath}")
-        
-        elif download_type == "subtitle":
-             log_message(f"Subtitle download requested.")
+        audio_pps.append({'key': 'FFmpegExtractAudio', 'preferredcodec': temp_ext})
         
-        elif download_type == "cover":
-             final_cover_path = f"{base_outtmpl}.{target_ext}"
-             if os.path.exists(final_cover_path):
-                 log_message(f"Cover downloaded.")
-             else:
-                 log_message(f"Cover process finished.")
-
-
-        download_history[video_id] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        save_history()
+        if options["embed_thumbnail"]:
+            audio_pps.append({'key': 'FFmpegMetadata'})
+            
+        ydl_opts.update({"format": "bestaudio[ext=m4a]/bestaudio/best", "postprocessors": audio_pps + subtitle_pps})
 
-    if not cancel_event.is_set(): log_message("All tasks finished.")
-    download_btn.config(state="normal"); cancel_btn.config(state="disabled")
-    refresh_history()
 
-def progress_hook(d):
+    elif download_type == "cover":
+        temp_ext = target_ext
+        ydl_opts.update({
+            "writethumbnail": True, 
+            "skip_download": True, 
+            "ignoreerrors": True, 
+            "postprocessors": [{'key': 'FFmpegThumbnailsConvertor', 'format': temp_ext}]
+        })
+    
+    elif download_type == "subtitle":
+        ydl_opts.update({"skip_download": True, "postprocessors": subtitle_pps})
+        temp_ext = "srt"
+    return ydl_opts, temp_ext
+
+def download_analyzed(ydl, url, video_id, log):
+    # Reuse the info dict from Analyze while its format URLs are still valid; re-extract otherwise
+    info_dict = cache_get_info(video_id) if video_id else None
+    if info_dict:
+        try: return ydl.process_ie_result(info_dict, download=True)
+        except DownloadError as e:
+            # Only an expired/forbidden media URL is worth a fresh extraction; post-processing and disk errors are not
+            if not format_url_expired(e): raise
+            log(f"Stored formats rejected ({e}), re-extracting...")
+    return ydl.extract_info(url, download=True)
+
+def format_url_expired(error):
+    cause = (getattr(error, "exc_info", None) or (None, None))[1]
+    return (getattr(cause, "status", None) or getattr(cause, "code", None)) in (403, 404, 410)  # yt-dlp's HTTPError / urllib's
+
+def item_ydl_opts(base_outtmpl, split_streams=False):
+    # Split streams get one file per format (<base>.f<id>.<ext>); thumbnail and subtitles keep the plain name (<base>.<lang>.srt)
+    if split_streams: return {"outtmpl": f"{base_outtmpl}.f%(format_id)s.%(ext)s", "outtmpl_thumbnail": base_outtmpl, "outtmpl_subtitle": base_outtmpl}
+    return {"outtmpl": base_outtmpl}
+
+def get_session(batch):
+    # One YoutubeDL per worker thread for the whole batch: HTTP connections, extractor
+    # instances and player JS stay warm between items
+    local = batch["session_local"]
+    if getattr(local, "session", None) is None:
+        session = SimpleNamespace(result=None)
+        session.ydl = YoutubeDL(dict(batch["ydl_opts"], progress_hooks=[lambda d: progress_hook(d, batch, session.result)],
+                                     postprocessor_hooks=[lambda d: postprocessor_hook(d, batch, session.result)]))
+        with batch["progress_lock"]: batch["sessions"].append(session.ydl)
+        local.session = session
+    return local.session
+
+def apply_item_opts(ydl, item_opts):
+    for key, value in item_opts.items():
+        if key == "outtmpl": ydl.params["outtmpl"]["default"] = value
+        elif key == "outtmpl_thumbnail": ydl.params["outtmpl"]["thumbnail"] = value
+        elif key == "outtmpl_subtitle": ydl.params["outtmpl"]["subtitle"] = value
+        else: ydl.params[key] = value
+
+def close_sessions(batch):
+    for ydl in batch["sessions"]:
+        try: ydl.close()
+        except Exception: pass
+
+# --- Transcode Queue ---
+def submit_transcode(batch, result, ffmpeg_cmd, source, final_filepath, cleanup, fallback=True):
+    # The download worker moves on to its next item while ffmpeg runs on the transcode pool.
+    # fallback: the source is a complete file that may be kept if ffmpeg fails (not so for one stream of a single-pass mux)
+    set_job_progress(batch, result["key"], 100, "Converting")
+    result["metrics"]["open"]["transcode_wait"] = time.perf_counter()
+    set_job_state(result["job_id"], "post-processing", transcode={"cmd": ffmpeg_cmd, "source": source, "final": final_filepath, "cleanup": cleanup, "fallback": fallback})
+    batch["pending"].append(batch["transcode_pool"].submit(run_transcode, batch, result, ffmpeg_cmd, source, final_filepath, cleanup, fallback))
+    return True
+
+def run_transcode(batch, result, ffmpeg_cmd, source, final_filepath, cleanup, fallback=True):
+    log = lambda msg: batch["emit"]("log", message=msg)
+    end_span(result, "transcode_wait")
+    if batch["cancel"].is_set(): return finish_job(batch, result)
+    log(f"Converting {os.path.basename(source)} to {os.path.splitext(final_filepath)[1][1:]}...")
+    try:
+        start_span(result, "convert"); run_ffmpeg(ffmpeg_cmd, batch["cancel"]); end_span(result, "convert")
+        log(f"Conversion successful.")
+        for path in cleanup:
+            if path and path != final_filepath and os.path.exists(path): os.remove(path)
+        result["path"] = final_filepath
+    except DownloadCancelled:
+        # The half-written output goes, the downloaded source stays so the conversion can be resumed
+        if final_filepath != source and os.path.exists(final_filepath): os.remove(final_filepath)
+        log(f"Conversion cancelled: {os.path.basename(final_filepath)}")
+        return finish_job(batch, result)
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        if not fallback:
+            # A lone stream is no usable result: fail the item, keep the streams so a retry only re-runs the mux
+            if os.path.exists(final_filepath): os.remove(final_filepath)
+            log(f"FFmpeg mux failed for '{result['title']}', the downloaded streams are kept for a retry.")
+            result.update(status="failed", error=f"ffmpeg mux failed: {e}")
+            return finish_job(batch, result)
+        log(f"FFmpeg conversion failed! Keeping original format.")
+        result["path"] = source
+    except Exception as e:
+        log(f"Error converting '{result['title']}': {e}")
+        result.update(status="failed", error=str(e))
+        return finish_job(batch, result)
+    log(f"Saved to: {result['path']}")
+    if result["video_id"]: record_history(result["video_id"])
+    result["status"] = "done"
+    return finish_job(batch, result)
+
+# --- Direct Covers ---
+def fetch_thumbnail(batch, result, url, log):
+    # The thumbnail URL from Analyze, fetched over a kept-alive connection: no extraction per item
+    start_span(result, "download")
+    try: data = http_get(url)
+    except (OSError, http.client.HTTPException) as e: log(f"Warning fetching cover '{result['title']}': {e}"); return None
+    finally: end_span(result, "download")
+    moved_bytes(batch, result, len(data))
+    return None if batch["cancel"].is_set() else data
+
+def save_cover(batch, result, data, base_outtmpl, log):
+    # Already in the wanted format: written as-is. Anything else waits for convert_covers() after the downloads
+    ext, final_filepath = image_extension(data), f"{base_outtmpl}.{batch['target_ext']}"
+    path = final_filepath if ext == batch["target_ext"] else f"{base_outtmpl}.{ext}"
+    with open(path, "wb") as f: f.write(data)
+    if path != final_filepath:
+        with batch["progress_lock"]: batch["covers"].append((result, path, final_filepath))
+        set_job_progress(batch, result["key"], 50, "Converting")
+        return True
+    log(f"Saved to: {final_filepath}")
+    if result["video_id"]: record_history(result["video_id"])
+    result.update(status="done", path=final_filepath)
+
+def image_extension(data):
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP": return "webp"
+    if data[:3] == b"\xff\xd8\xff": return "jpg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n": return "png"
+    return "img"
+
+def convert_covers(batch):
+    # Every cover that needs converting goes through a handful of ffmpeg runs instead of one process per image
+    log = lambda msg: batch["emit"]("log", message=msg)
+    covers = batch["covers"]
+    log(f"Converting {len(covers)} covers to {batch['target_ext']}...")
+    for start in range(0, len(covers), COVER_BATCH_SIZE):
+        chunk = covers[start:start + COVER_BATCH_SIZE]
+        cmd = [batch["ffmpeg_exe_path"], '-y', '-loglevel', 'error']
+        for _, source, _ in chunk: cmd += ['-i', source]
+        for n, (_, _, final_filepath) in enumerate(chunk): cmd += ['-map', f'{n}:v:0', final_filepath]
+        for result, _, _ in chunk: start_span(result, "convert")
+        try: run_ffmpeg(cmd, batch["cancel"])
+        except (subprocess.CalledProcessError, FileNotFoundError, DownloadCancelled): pass
+        for result, source, final_filepath in chunk:
+            end_span(result, "convert")
+            if batch["cancel"].is_set():
+                for path in (source, final_filepath):
+                    if os.path.exists(path): os.remove(path)
+            elif os.path.exists(final_filepath) and os.path.getsize(final_filepath):
+                os.remove(source); result.update(status="done", path=final_filepath)
+            else:
+                # A bad image fails its whole run; those covers keep their original format
+                if os.path.exists(final_filepath): os.remove(final_filepath)
+                log(f"Cover conversion failed, keeping {os.path.basename(source)}")
+                result.update(status="done", path=source)
+            if result["status"] == "done" and result["video_id"]: record_history(result["video_id"])
+            finish_job(batch, result)
+
+# --- Direct Subtitles ---
+def fetch_subtitles(batch, result, job, base_outtmpl, log):
+    # Track URLs from the metadata cache (one extraction if the row was only flat-listed), converted to SRT without ffmpeg.
+    # Returns False when anything is missing so the caller can fall back to yt-dlp
+    video_id, lang = job.get("video_id", ""), batch["options"]["subtitle_language"]
+    entry = cache_get_videos([video_id]).get(video_id) if video_id else None
+    if not entry or entry.get("flat"):
+        start_span(result, "extract")
+        try: entry = hydrate_entry(job["url"])
+        except Exception as e: log(f"Warning processing '{result['title']}': {e}"); return False
+        finally: end_span(result, "extract")
+        if not entry: return False
+    tracks = {code: t for code, t in (entry.get("subtitles") or {}).items() if code != "live_chat" and (not lang or lang == "all" or code == lang)}
+    if not tracks:
+        log(f"No subtitles{f' in {lang}' if lang and lang != 'all' else ''}: {result['title']}")
+        result["status"] = "skipped"; return True
+    written = {}  # suffix -> path, one file per language
+    for code, available in sorted(tracks.items()):
+        track = next((t for ext in SUBTITLE_SOURCE_FORMATS for t in available if t.get("ext") == ext), None)
+        if track is None: return False
+        start_span(result, "download")
+        try: data = http_get(track["url"])
+        except (OSError, http.client.HTTPException) as e: log(f"Warning fetching {code} subtitles for '{result['title']}': {e}"); return False
+        finally: end_span(result, "download")
+        moved_bytes(batch, result, len(data))
+        if batch["cancel"].is_set(): return True
+        path = f"{base_outtmpl}.{code}.srt"
+        start_span(result, "convert")
+        try:
+            with open(path, "w", encoding="utf-8") as f: f.writelines(subtitle_to_srt(data.decode("utf-8-sig"), track["ext"]))
+        except (ValueError, KeyError, TypeError) as e:
+            log(f"Warning converting {code} subtitles for '{result['title']}': {e}"); return False
+        finally: end_span(result, "convert")
+        written[f".{code}.srt"] = path
+    log(f"Saved to: {', '.join(written.values())}")
+    if video_id: record_history(video_id)
+    result.update(status="done", path=next(iter(written.values())), paths=written)
+    return True
+
+def subtitle_to_srt(text, ext):
+    if ext == "srt": return [text]
+    if ext == "json3": return json3_to_srt(text)
+    return vtt_to_srt(text.splitlines())
+
+def vtt_to_srt(lines):
+    # WebVTT cue by cue: the header, NOTE/STYLE/REGION blocks, cue ids, cue settings and inline tags are dropped
+    index, block = 0, []
+    for line in itertools.chain(lines, [""]):
+        if line.strip(): block.append(line.rstrip()); continue
+        timing = next((i for i, l in enumerate(block) if "-->" in l), None)
+        text = "\n".join(t for t in (html.unescape(re.sub(r"<[^>]*>", "", l)).strip() for l in block[timing + 1:]) if t) if timing is not None else ""
+        if text:
+            start, _, end = block[timing].partition("-->")
+            index += 1
+            yield f"{index}\n{srt_timestamp(vtt_ms(start))} --> {srt_timestamp(vtt_ms(end.split()[0]))}\n{text}\n\n"
+        block = []
+
+def json3_to_srt(text):
+    # YouTube's timed-text JSON: one event per caption, text split into segments; an event without a duration lasts until the next one
+    index, events = 0, [event for event in json.loads(text).get("events") or [] if "tStartMs" in event]
+    for event, following in itertools.zip_longest(events, events[1:]):
+        caption = "".join(seg.get("utf8", "") for seg in event.get("segs") or []).strip()
+        if not caption: continue
+        start = int(event["tStartMs"])
+        end = start + int(event["dDurationMs"]) if event.get("dDurationMs") else max(start, int(following["tStartMs"])) if following else start + 2000
+        index += 1
+        yield f"{index}\n{srt_timestamp(start)} --> {srt_timestamp(end)}\n{caption}\n\n"
+
+def vtt_ms(stamp):
+    # [hh:]mm:ss.ttt
+    parts = stamp.strip().replace(",", ".").split(":")
+    seconds = float(parts[-1]) + 60 * int(parts[-2]) + (3600 * int(parts[-3]) if len(parts) > 2 else 0)
+    return round(seconds * 1000)
+
+def srt_timestamp(ms):
+    hours, ms = divmod(ms, 3600000); minutes, ms = divmod(ms, 60000); seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+def http_get(url, redirects=5):
+    # One keep-alive connection per thread and host (urllib opens a new one per request)
+    for _ in range(redirects + 1):
+        parts = urllib.parse.urlsplit(url)
+        for attempt in range(2):
+            conn = http_connection(parts.scheme, parts.netloc)
+            try:
+                conn.request("GET", (parts.path or "/") + (f"?{parts.query}" if parts.query else ""), headers={"User-Agent": HTTP_USER_AGENT})
+                response = conn.getresponse(); data = response.read()
+                break
+            except (OSError, http.client.HTTPException):
+                # The server dropped an idle connection: once more on a fresh one
+                http_local.connections.pop((parts.scheme, parts.netloc), None); conn.close()
+                if attempt: raise
+        if response.will_close: http_local.connections.pop((parts.scheme, parts.netloc), None); conn.close()
+        if response.status in (301, 302, 303, 307, 308) and response.getheader("Location"):
+            url = urllib.parse.urljoin(url, response.getheader("Location")); continue
+        if response.status != 200: raise OSError(f"HTTP {response.status} {response.reason}")
+        return data
+    raise OSError("too many redirects")
+
+def http_connection(scheme, netloc):
+    connections = getattr(http_local, "connections", None)
+    if connections is None: connections = http_local.connections = {}
+    if (scheme, netloc) not in connections:
+        connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        connections[(scheme, netloc)] = connection_class(netloc, timeout=30)
+    return connections[(scheme, netloc)]
+
+def run_ffmpeg(ffmpeg_cmd, cancel=None):
+    startupinfo = None
+    if platform.system() == "Windows":
+        startupinfo = subprocess.STARTUPINFO(); startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    with subprocess.Popen(ffmpeg_cmd, startupinfo=startupinfo, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+        with child_lock: child_processes.add(process)
+        try:
+            while True:
+                try: stdout, stderr = process.communicate(timeout=0.2); break
+                except subprocess.TimeoutExpired:
+                    if cancel is not None and cancel.is_set():
+                        process.kill(); process.communicate()
+                        raise DownloadCancelled()
+        finally:
+            with child_lock: child_processes.discard(process)
+    if process.returncode: raise subprocess.CalledProcessError(process.returncode, ffmpeg_cmd, stdout, stderr)
+
+def kill_child_processes():
+    with child_lock:
+        for process in child_processes:
+            try: process.kill()
+            except OSError: pass
+
+def mp3_encode_command(ffmpeg_exe_path, source, thumbnail, final_filepath, audio_quality, title, artist):
+    bitrate = re.search(r'(\d+)', audio_quality).group(1) if re.search(r'(\d+)', audio_quality) else "192"
+    cmd = [ffmpeg_exe_path, '-y', '-i', source]
+    if thumbnail: cmd += ['-i', thumbnail, '-map', '0:a:0', '-map', '1:0', '-codec:v', 'mjpeg', '-disposition:v', 'attached_pic', '-metadata:s:v', 'title=Album cover']
+    else: cmd += ['-vn']
+    return cmd + ['-codec:a', 'libmp3lame', '-b:a', f'{bitrate}k', '-id3v2_version', '3', '-map_metadata', '0',
+                  '-metadata', f'title={title}', '-metadata', f'artist={artist}', final_filepath]
+
+def downloaded_filepath(info):
+    for download in (info or {}).get("requested_downloads") or []:
+        path = download.get("filepath") or download.get("_filename")
+        if path and os.path.exists(path): return path
+    return None
+
+def downloaded_filepaths(info):
+    # Video stream first: requested_downloads follows the order of the format spec
+    downloads = (info or {}).get("requested_downloads") or []
+    return [path for path in (d.get("filepath") or d.get("_filename") for d in downloads) if path and os.path.exists(path)]
+
+def mux_command(ffmpeg_exe_path, streams, thumbnail, final_filepath, options, info, title, artist):
+    # One ffmpeg pass straight into the final container: streams copied (audio re-encoded only when it isn't AAC
+    # for m4a), cover art and tags added on the way
+    container, is_video = os.path.splitext(final_filepath)[1][1:], options["download_type"] == "video"
+    cover = thumbnail if thumbnail and container != "mkv" else None
+    cmd = [ffmpeg_exe_path, '-y']
+    for path in streams + ([cover] if cover else []): cmd += ['-i', path]
+    cmd += ['-map', '0:v:0', '-map', f'{len(streams) - 1}:a:0?'] if is_video else ['-map', '0:a:0']
+    if cover: cmd += ['-map', f'{len(streams)}:0']
+    cmd += ['-c', 'copy']
+    if cover: cmd += [f'-c:v:{int(is_video)}', 'mjpeg', f'-disposition:v:{int(is_video)}', 'attached_pic']
+    if not is_video and not str(((info.get("requested_downloads") or [info])[0]).get("acodec") or "").startswith("mp4a"):
+        bitrate = re.search(r'(\d+)', options["audio_quality"])
+        cmd += ['-c:a', 'aac', '-b:a', f'{bitrate.group(1) if bitrate else "192"}k']
+    if thumbnail and container == "mkv":
+        ext = os.path.splitext(thumbnail)[1].lower()
+        cmd += ['-attach', thumbnail, '-metadata:s:t', f'mimetype=image/{"jpeg" if ext in (".jpg", ".jpeg") else ext[1:]}', '-metadata:s:t', f'filename=cover{ext}']
+    tags = {"title": title, "artist": artist, "date": info.get("upload_date"), "comment": info.get("webpage_url"), "description": info.get("description")}
+    for key, value in tags.items():
+        if value: cmd += ['-metadata', f'{key}={value}']
+    return cmd + [final_filepath]
+
+def downloaded_thumbnail(info):
+    for thumbnail in reversed((info or {}).get("thumbnails") or []):
+        if thumbnail.get("filepath") and os.path.exists(thumbnail["filepath"]): return thumbnail["filepath"]
+    return None
+
+def progress_hook(d, batch, result):
+    # Raising here aborts the transfer at the next block and leaves the .part file for resume
+    if batch["cancel"].is_set(): raise DownloadCancelled()
     if d["status"] == "downloading":
+        end_span(result, "extract"); start_span(result, "download")
+        # Hooks run inside yt-dlp's read loop (per block or fragment), so waiting here paces the transfer itself
+        delta = count_bytes(d, batch, result)
+        if batch["bucket"] and delta > 0: batch["bucket"].consume(delta, batch["cancel"])
         percent = d.get("_percent_str", "0%").strip()
-        try: progress_var.set(float(percent.replace("%", "")))
-        except ValueError: pass
-    elif d["status"] == "finished": progress_var.set(100)
+        try: percent = float(percent.replace("%", ""))
+        except ValueError: return
+    elif d["status"] == "finished":
+        end_span(result, "extract"); end_span(result, "download")
+        result["metrics"]["bytes"] += d.get("total_bytes") or d.get("downloaded_bytes") or 0
+        percent = 100
+    else: return
+    set_job_progress(batch, result["key"], percent)
+
+def count_bytes(d, batch, result):
+    # New bytes since the last report of this file; they feed the throughput figure and the bandwidth budget
+    file_key, done = (result["key"], d.get("tmpfilename") or d.get("filename")), d.get("downloaded_bytes") or 0
+    with batch["progress_lock"]:
+        # The first report of a resumed .part file already includes bytes from earlier runs
+        delta = done - batch["bytes_seen"].get(file_key, done)
+        batch["bytes_seen"][file_key] = max(done, batch["bytes_seen"].get(file_key, 0))
+        if delta > 0: batch["bytes_moved"] += delta
+    return delta
+
+class TokenBucket:
+    # One budget (bytes/s) shared by every in-flight download; callers may run into debt and then wait it off
+    def __init__(self, rate):
+        self.rate, self.tokens, self.updated, self.lock = rate, rate, time.monotonic(), threading.Lock()
+
+    def consume(self, amount, cancel):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate) - amount
+            self.updated = now
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0: cancel.wait(wait)
+
+def postprocessor_hook(d, batch, result):
+    if d["status"] == "started" and batch["cancel"].is_set(): raise DownloadCancelled()
+    phase = POSTPROCESSOR_PHASES.get(d.get("postprocessor"), "postprocess")
+    if d["status"] == "started": start_span(result, phase)
+    elif d["status"] == "finished": end_span(result, phase)
+
+# --- Item Metrics ---
+def start_span(result, phase):
+    result["metrics"]["open"].setdefault(phase, time.perf_counter())
+
+def end_span(result, phase):
+    started = result["metrics"]["open"].pop(phase, None)
+    if started is not None:
+        spans = result["metrics"]["spans"]
+        spans[phase] = round(spans.get(phase, 0) + time.perf_counter() - started, 4)
+
+def close_metrics(batch, result):
+    metrics = result["metrics"]
+    for phase in list(metrics["open"]): end_span(result, phase)
+    metrics["total_s"] = round(time.perf_counter() - metrics.pop("started"), 4)
+    del metrics["open"]
+    if metrics["bytes"] and metrics["spans"].get("download"): metrics["rate_bps"] = round(metrics["bytes"] / metrics["spans"]["download"])
+    path = batch["options"].get("metrics_file")
+    if not path: return
+    record = {"time": datetime.now().isoformat(timespec="seconds"), "video_id": result["video_id"], "title": result["title"], "status": result["status"], **metrics}
+    try:
+        with batch["metrics_lock"], open(path, "a", encoding="utf-8") as f: f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        batch["emit"]("log", message=f"Error writing metrics: {e}")
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] if values else 0
+
+def summarize_metrics(results):
+    phases = {}
+    for result in results:
+        metrics = result.get("metrics") or {}
+        if result["status"] != "cancelled": phases.setdefault("queue_wait", []).append(metrics.get("queue_wait_s", 0))
+        for phase, seconds in metrics.get("spans", {}).items(): phases.setdefault(phase, []).append(seconds)
+    ordered = [phase for phase in METRIC_PHASES if phase in phases] + sorted(set(phases) - set(METRIC_PHASES))
+    return {phase: {"count": len(phases[phase]), "p50_s": round(percentile(phases[phase], 50), 3), "p95_s": round(percentile(phases[phase], 95), 3),
+                    "total_s": round(sum(phases[phase]), 3)} for phase in ordered}
+
+def format_stats(stats):
+    text = ", ".join(f"{phase} {s['p50_s']:.2f}/{s['p95_s']:.2f}s" for phase, s in stats.items())
+    busiest = max((phase for phase in stats if not phase.endswith("_wait")), key=lambda phase: stats[phase]["total_s"], default=None)
+    return f"{text} (most time: {busiest})" if busiest else text
 
 def sort_treeview(column_id):
     global last_sort_column, sort_direction
     if column_id == last_sort_column: sort_direction = "descending" if sort_direction == "ascending" else "ascending"
     else: last_sort_column, sort_direction = column_id, "ascending"
-    items = [(preview_tree.set(k, column_id), k) for k in preview_tree.get_children("")]
-    def sort_key(item):
-        value = item[0]
-        if column_id in ("title", "url", "last_download"): return str(value).lower()
-        elif column_id == "duration":
-            try: m, s = map(int, value.split(':')); return m * 60 + s
-            except: return -1
-        return value
-    items.sort(key=sort_key, reverse=(sort_direction == "descending"))
-    for index, (value, k) in enumerate(items): preview_tree.move(k, "", index)
+    if column_id not in sort_cache:
+        attr = {"title": "title_key", "duration": "duration_key", "last_download": "last_download"}[column_id]
+        sort_cache[column_id] = sorted(preview_entries, key=lambda k: getattr(preview_entries[k], attr))
+    ordered = sort_cache[column_id]
+    preview_order[:] = ordered[::-1] if sort_direction == "descending" else ordered
+    render_view()
     for col in preview_tree["columns"]:
         heading_text = preview_tree.heading(col, 'text').replace(' 🔽', '').replace(' 🔼', '')
         if col == column_id:
@@ -625,125 +2101,485 @@ def sort_treeview(column_id):
             preview_tree.heading(col, text=f"{heading_text}{arrow}")
         else: preview_tree.heading(col, text=heading_text)
 
-# --- GUI Layout ---
-root = tk.Tk()
-root.title("yt-dlp Downloader GUI v1.4.11x (2026.01.02)")
-root.geometry("980x920")
-root.resizable(False, False)
-
-# URL Input Area
-url_frame = tk.Frame(root)
-url_frame.pack(fill="x", padx=10, pady=5)
-tk.Label(url_frame, text="URL:").pack(side="left")
-
-url_combo_frame = tk.Frame(url_frame)
-url_combo_frame.pack(side="left", fill="x", expand=True, padx=(5, 0))
-url_combo = ttk.Combobox(url_combo_frame, values=[])
-url_combo.pack(side="left", fill="x", expand=True)
-update_url_combo_values()
-
-tk.Button(url_combo_frame, text="+", command=add_url_history, width=3).pack(side="left", padx=(2,0))
-tk.Button(url_combo_frame, text="-", command=delete_url_history, width=3).pack(side="left", padx=(2,0))
-
-# Playlist Limit
-tk.Label(url_frame, text="Limit (0=All):").pack(side="left", padx=(10, 2))
-playlist_limit_spin = tk.Spinbox(url_frame, from_=0, to=9999, width=5)
-playlist_limit_spin.delete(0, "end")
-playlist_limit_spin.insert(0, config.get("playlist_limit", 0))
-playlist_limit_spin.pack(side="left", padx=(0, 5))
-
-tk.Button(url_frame, text="Analyze", command=parse_video, width=10, height=2).pack(side="left", padx=5)
-
-# Settings Area
-settings_frame = tk.Frame(root)
-settings_frame.pack(fill="x", padx=10, pady=5)
-download_type_var = tk.StringVar(value=config.get("download_type", "video"))
-tk.Label(settings_frame, text="Type:").pack(side="left")
-tk.Radiobutton(settings_frame, text="Video", variable=download_type_var, value="video", command=update_format_combobox_visibility).pack(side="left", padx=(10, 0))
-tk.Radiobutton(settings_frame, text="Audio", variable=download_type_var, value="audio", command=update_format_combobox_visibility).pack(side="left", padx=5)
-tk.Radiobutton(settings_frame, text="Cover", variable=download_type_var, value="cover", command=update_format_combobox_visibility).pack(side="left", padx=5)
-tk.Radiobutton(settings_frame, text="Subtitle", variable=download_type_var, value="subtitle", command=update_format_combobox_visibility).pack(side="left", padx=5)
-
-tk.Label(settings_frame, text=" | ").pack(side="left")
-tk.Label(settings_frame, text="Res:").pack(side="left")
-video_limit_combo = ttk.Combobox(settings_frame, values=["2160p", "1440p", "1080p", "720p", "480p", "360p", "240p", "144p"], width=7, state="readonly")
-video_limit_combo.set(config["video_limit"])
-video_limit_combo.pack(side="left", padx=5)
-tk.Label(settings_frame, text="Audio:").pack(side="left")
-audio_quality_combo = ttk.Combobox(settings_frame, values=list(AUDIO_QUALITY_MAP.keys()), width=15, state="readonly")
-audio_quality_combo.set(config["audio_quality"])
-audio_quality_combo.pack(side="left", padx=5)
-video_format_combo = ttk.Combobox(settings_frame, values=["mp4", "mkv"], width=5, state="readonly")
-video_format_combo.set(config["video_format"])
-audio_format_combo = ttk.Combobox(settings_frame, values=["mp3", "m4a"], width=5, state="readonly")
-audio_format_combo.set(config["audio_format"])
-cover_format_combo = ttk.Combobox(settings_frame, values=["webp"], width=5, state="readonly")
-cover_format_combo.set("webp")
-
-path_frame = tk.Frame(root)
-path_frame.pack(fill="x", padx=10)
-tk.Label(path_frame, text="Path:").pack(side="left")
-download_path_entry = tk.Entry(path_frame)
-download_path_entry.insert(0, config["download_path"])
-download_path_entry.pack(side="left", fill="x", expand=True)
-tk.Button(path_frame, text="Browse...", command=select_download_path).pack(side="left", padx=5)
-tk.Button(path_frame, text="Open", command=open_download_path).pack(side="left", padx=5)
-
-options_frame = tk.Frame(root)
-options_frame.pack(fill="x", padx=10, pady=5, anchor="w")
-embed_thumbnail_var = tk.BooleanVar(value=config["embed_thumbnail"])
-tk.Checkbutton(options_frame, text="Embed Thumbnail", variable=embed_thumbnail_var).pack(side="left")
-add_track_number_var = tk.BooleanVar(value=config.get("add_track_number", True))
-tk.Checkbutton(options_frame, text="Add Track Num", variable=add_track_number_var).pack(side="left", padx=(10, 0))
-tk.Button(options_frame, text="Save Settings", command=save_limit_settings).pack(side="right")
-
-subtitles_frame = tk.Frame(root)
-subtitles_frame.pack(fill="x", padx=10, pady=(0,5), anchor="w")
-download_subtitles_var = tk.BooleanVar(value=config["download_subtitles_enabled"])
-download_subtitles_check = tk.Checkbutton(subtitles_frame, text="Download Subtitles", variable=download_subtitles_var, state="disabled")
-download_subtitles_check.pack(side="left")
-subtitle_lang_combo = ttk.Combobox(subtitles_frame, values=[], width=10, state="disabled")
-subtitle_lang_combo.set(config["subtitle_language"])
-subtitle_lang_combo.pack(side="left", padx=5)
-loading_label = tk.Label(subtitles_frame, text="", width=15)
-loading_label.pack(side="left", padx=5)
-
-preview_frame = tk.Frame(root)
-preview_frame.pack(fill="both", expand=True, padx=10)
-preview_control_frame = tk.Frame(preview_frame)
-preview_control_frame.pack(fill="x")
-tk.Label(preview_control_frame, text="Preview:").pack(side="left", pady=(5,0))
-tk.Button(preview_control_frame, text="Refresh", command=refresh_history).pack(side="right", padx=(5, 0), pady=(5,0))
-tk.Button(preview_control_frame, text="Clear", command=deselect_all).pack(side="right", padx=5, pady=(5,0))
-tk.Button(preview_control_frame, text="Select All", command=select_all).pack(side="right", padx=5, pady=(5,0))
-tk.Button(preview_control_frame, text="Select New", command=select_undownloaded).pack(side="right", padx=5, pady=(5,0))
-
-columns = ("check", "url", "title", "duration", "last_download", "video_id", "content_type", "playlist_title", "channel_name", "subtitles", "playlist_index")
-preview_tree = ttk.Treeview(preview_frame, columns=columns, show="headings", height=15)
-preview_tree.heading("check", text="✓"); preview_tree.heading("url", text="URL"); preview_tree.heading("title", text="Title", command=lambda: sort_treeview("title")); preview_tree.heading("duration", text="Duration", command=lambda: sort_treeview("duration")); preview_tree.heading("last_download", text="Last DL", command=lambda: sort_treeview("last_download"))
-preview_tree.column("check", width=30, anchor="center", stretch=False); preview_tree.column("url", width=150, stretch=False); preview_tree.column("title", width=350); preview_tree.column("duration", width=70, anchor="center", stretch=False); preview_tree.column("last_download", width=120, anchor="center", stretch=False)
-for col in ["video_id", "content_type", "playlist_title", "channel_name", "subtitles", "playlist_index"]: preview_tree.column(col, width=0, stretch=tk.NO)
-preview_tree.pack(fill="both", expand=True, pady=5)
-preview_tree.bind("<Button-1>", toggle_check)
-preview_tree.bind("<KeyRelease-space>", toggle_check_with_space)
-preview_tree.bind("<<TreeviewSelect>>", on_tree_selection_change)
-
-progress_frame = tk.Frame(root)
-progress_frame.pack(fill="x", padx=10, pady=5)
-progress_var = tk.DoubleVar()
-progress_bar = ttk.Progressbar(progress_frame, variable=progress_var, maximum=100)
-progress_bar.pack(side="left", fill="x", expand=True)
-download_btn = tk.Button(progress_frame, text="Download", command=start_download_thread, width=10, height=2)
-download_btn.pack(side="left", padx=(5, 0))
-cancel_btn = tk.Button(progress_frame, text="Cancel", command=cancel_download, width=10, height=2, state="disabled")
-cancel_btn.pack(side="left", padx=(5, 0))
-log_frame = tk.Frame(root)
-log_frame.pack(fill="both", expand=True, padx=10, pady=5)
-tk.Label(log_frame, text="Log:").pack(anchor="w")
-log_text = tk.Text(log_frame, height=8)
-log_text.pack(fill="both", expand=True, pady=5)
-log_text.config(state="normal")
-
-update_format_combobox_visibility()
-
-root.mainloop()
\ No newline at end of file
+def report_startup():
+    # Time from interpreter start of this module to the first idle window frame
+    log_message(f"Window ready in {time.perf_counter() - STARTUP_T0:.2f}s.")
+    threading.Thread(target=preload_yt_dlp, daemon=True).start()
+
+def on_close():
+    cancel_event.set(); kill_child_processes()
+    if coordinator is not None: coordinator.shutdown()
+    compact_history()
+    root.destroy()
+
+# --- Coordinator / Workers ---
+class Coordinator(http.server.ThreadingHTTPServer):
+    # Hands out the jobs of its batches to worker processes over HTTP. A lease is renewed by every progress report and
+    # goes back to the queue when it runs out; completions are recorded in this process's history and job queue
+    daemon_threads = True
+
+    def __init__(self, address, token="", on_event=None):
+        super().__init__(address, CoordinatorHandler)
+        self.token, self.emit = token, on_event or (lambda kind, **data: None)
+        self.lock, self.leases, self.batch_ids = threading.Lock(), {}, set()
+        self.lease_s = float(config.get("worker_lease_seconds", 120))
+
+    def add_jobs(self, jobs):
+        with self.lock: self.batch_ids.update(int(job["job_id"].split(":")[0]) for job in jobs if job.get("job_id"))
+
+    # Lock order: self.lock is never held while the job queue is read or written (queue_lock), so the two can't deadlock
+    def lease(self, worker, count):
+        now = time.monotonic()
+        with self.lock:
+            expired = [(job_id, owner, key) for job_id, (owner, expires, key) in self.leases.items() if expires < now]
+            for job_id, _, _ in expired: del self.leases[job_id]
+            batch_ids, held = set(self.batch_ids), set(self.leases)
+        for job_id, owner, key in expired:
+            self.emit("log", message=f"Lease on {job_id} held by {owner} expired, back in the queue.")
+            self.emit("progress", key=key, percent=0, status="Queued")
+        candidates = next_queued_jobs(batch_ids, count, held)
+        with self.lock:
+            # Another worker may have leased some of them in the meantime
+            picked = [candidate for candidate in candidates if candidate[0] not in self.leases]
+            for job_id, job, _ in picked: self.leases[job_id] = (worker, now + self.lease_s, job.get("key"))
+            drained = not candidates and not self.leases
+        for job_id, job, _ in picked:
+            set_job_state(job_id, "downloading")
+            self.emit("progress", key=job.get("key"), percent=0, status=f"→ {worker}")
+        # Workers never see job ids or stored conversions: their sources would be on this machine, and their own queue stays untouched
+        return {"jobs": [{"lease": job_id, "job": {k: v for k, v in job.items() if k not in ("job_id", "transcode")}, "options": options}
+                         for job_id, job, options in picked], "drained": drained}
+
+    def progress(self, worker, updates):
+        for update in updates:
+            with self.lock:
+                held = self.leases.get(update.get("lease"))
+                if not held or held[0] != worker: continue
+                self.leases[update["lease"]] = (worker, time.monotonic() + self.lease_s, held[2])
+            self.emit("progress", key=held[2], percent=update.get("percent") or 0, status=update.get("status"))
+
+    def complete(self, worker, report):
+        # Accepted unless the lease ran out and the job went to another worker in the meantime
+        with self.lock:
+            held = self.leases.get(report.get("lease"))
+            if held and held[0] != worker: return False
+        status = report.get("status")
+        if status == "done" and report.get("video_id"): record_history(report["video_id"])
+        # Released only once the queue has the final state, so the job is never leased again in between
+        set_job_state(report["lease"], {"done": "done", "skipped": "done", "failed": "failed"}.get(status, "queued"), error=report.get("error"))
+        with self.lock:
+            if self.leases.get(report["lease"], (worker,))[0] == worker: self.leases.pop(report["lease"], None)
+        if held: self.emit("progress", key=held[2], percent=100, status={"done": "Done", "skipped": "Skipped", "failed": "Failed"}.get(status, "Queued"))
+        self.emit("log", message=f"[{worker}] {status}: {report.get('title') or report.get('video_id')}")
+        states = self.status()["states"]
+        if states: self.emit("overall", percent=100 * (states.get("done", 0) + states.get("failed", 0)) / sum(states.values()))
+        return True
+
+    def status(self):
+        with self.lock: batch_ids, leased = list(self.batch_ids), {job_id: owner for job_id, (owner, _, _) in self.leases.items()}
+        db = open_job_queue()
+        with queue_lock:
+            counts = dict(db.execute(f"SELECT state, COUNT(*) FROM jobs WHERE batch_id IN ({','.join('?' * len(batch_ids))}) GROUP BY state", batch_ids).fetchall())
+        return {"states": counts, "leased": leased}
+
+class CoordinatorHandler(http.server.BaseHTTPRequestHandler):
+    # POST /lease {worker, count} -> {jobs: [{lease, job, options}], drained}; POST /progress {worker, updates: [{lease, percent, status}]};
+    # POST /complete {worker, lease, status, video_id, title, path, error}; GET /status
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if not self.authorized(): return
+        if self.path == "/status": return self.reply(self.server.status())
+        self.send_error(404)
+
+    def do_POST(self):
+        if not self.authorized(): return
+        try: body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        except ValueError: return self.send_error(400)
+        worker = str(body.get("worker") or self.client_address[0])
+        if self.path == "/lease": return self.reply(self.server.lease(worker, max(1, int(body.get("count") or 1))))
+        if self.path == "/progress": self.server.progress(worker, body.get("updates") or []); return self.reply({})
+        if self.path == "/complete": return self.reply({"accepted": self.server.complete(worker, body)})
+        self.send_error(404)
+
+    def authorized(self):
+        if not self.server.token or self.headers.get("X-Token") == self.server.token: return True
+        self.send_error(403); return False
+
+    def reply(self, data):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json"); self.send_header("Content-Length", str(len(payload)))
+        self.end_headers(); self.wfile.write(payload)
+
+    def log_message(self, *args): pass
+
+def start_coordinator(host, port, token="", on_event=None):
+    server = Coordinator((host, port), token, on_event)
+    threading.Thread(target=server.serve_forever, daemon=True, name="coordinator").start()
+    return server
+
+def coordinator_call(base_url, path, payload, token=""):
+    request = urllib.request.Request(base_url.rstrip("/") + path, data=json.dumps(payload).encode("utf-8"), method="POST",
+                                     headers={"Content-Type": "application/json", "X-Token": token})
+    with urllib.request.urlopen(request, timeout=30) as response: return json.loads(response.read() or b"{}")
+
+def run_worker(base_url, overrides, token="", name=None, until_drained=False, cancel=None):
+    # Leases up to parallel_downloads jobs at a time and runs them through run_jobs() like a local batch;
+    # options come from the coordinator, the WORKER_LOCAL_OPTIONS from this host's config.json, overridden by its command line
+    name, cancel = name or f"{socket.gethostname()}:{os.getpid()}", cancel or threading.Event()
+    overrides = {k: v for k, v in default_options(**overrides).items() if k in WORKER_LOCAL_OPTIONS}
+    call = lambda path, payload: coordinator_call(base_url, path, dict(payload, worker=name), token)
+    count = max(1, int(overrides["parallel_downloads"] or 1))
+    log_message(f"Worker {name} connected to {base_url}.")
+    while not cancel.is_set():
+        try: reply = call("/lease", {"count": count})
+        except (OSError, ValueError) as e:
+            log_message(f"Coordinator unreachable ({e}), retrying..."); cancel.wait(WORKER_POLL_S); continue
+        if reply["jobs"]: run_leased(reply["jobs"], overrides, call, cancel)
+        elif until_drained and reply.get("drained"): log_message("Queue drained."); return
+        else: cancel.wait(WORKER_POLL_S)
+
+def run_leased(leases, overrides, call, cancel):
+    # Progress goes back at most once a second, plus a heartbeat for every held lease (long conversions report nothing)
+    active, changed, lock, finished = {lease["lease"]: {"lease": lease["lease"], "percent": 0, "status": None} for lease in leases}, set(), threading.Lock(), threading.Event()
+
+    def on_event(kind, **data):
+        if kind == "log": log_message(data["message"])
+        elif kind == "progress":
+            with lock:
+                if data["key"] in active: active[data["key"]].update(percent=data["percent"], status=data["status"]); changed.add(data["key"])
+        elif kind == "item_done":
+            result = data["result"]
+            with lock: active.pop(result["key"], None); changed.discard(result["key"])
+            report = {k: result.get(k) for k in ("video_id", "title", "status", "path", "error")}
+            try: call("/complete", dict(report, lease=result["key"]))
+            except (OSError, ValueError) as e: log_message(f"Could not report '{result['title']}' to the coordinator: {e}")
+
+    def reporter():
+        last_beat = time.monotonic()
+        while not finished.wait(1):
+            with lock:
+                beat = time.monotonic() - last_beat >= WORKER_HEARTBEAT_S
+                updates = [dict(active[key]) for key in (list(active) if beat else changed) if key in active]
+                changed.clear()
+            if beat: last_beat = time.monotonic()
+            if updates:
+                try: call("/progress", {"updates": updates})
+                except (OSError, ValueError): pass
+
+    threading.Thread(target=reporter, daemon=True).start()
+    try:
+        groups = {}
+        for lease in leases: groups.setdefault(json.dumps(lease["options"], sort_keys=True), []).append(lease)
+        for group in groups.values():
+            if cancel.is_set(): break
+            run_jobs([dict(lease["job"], key=lease["lease"]) for lease in group], dict(group[0]["options"], **overrides), on_event=on_event, cancel=cancel)
+    finally:
+        finished.set()
+
+# --- Headless CLI ---
+def read_manifest(path):
+    # One JSON object per line: records with a video_id are jobs, records with only a url get analyzed
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"): continue
+            try: records.append(json.loads(line))
+            except json.JSONDecodeError as e: print(f"{path}:{line_no}: invalid JSON ({e})", file=sys.stderr)
+    return records
+
+def collect_jobs(urls, records, limit_count=0, force_refresh=False):
+    jobs = [dict({"content_type": "video", "playlist_title": "", "channel_name": "", "playlist_index": ""}, **r) for r in records if r.get("video_id") and r.get("url")]
+    urls = list(urls) + [r["url"] for r in records if r.get("url") and not r.get("video_id")]
+    # Analyzed concurrently, merged back in URL order so the first playlist a video appears in is where it's downloaded
+    per_url = {url: [] for url in urls}
+    for url in per_url: log_message(f"Analyzing: {url}")
+    analyze_urls(per_url, limit_count, force_refresh, lambda url, batch, *meta: per_url[url].extend(make_job(entry, *meta) for _, entry in batch))
+    return dedupe_jobs(jobs + [job for url_jobs in per_url.values() for job in url_jobs])
+
+def run_cli(argv):
+    parser = argparse.ArgumentParser(prog="ytdlpgui", description="Headless batch mode: analyze URLs or a JSONL manifest and download without the GUI.")
+    parser.add_argument("urls", nargs="*", help="video, playlist or channel URLs to analyze and download")
+    parser.add_argument("--saved-urls", action="store_true", help="also analyze every URL saved in the GUI's URL history")
+    parser.add_argument("--manifest", help="JSONL file of jobs (url, video_id, title, ...) or {\"url\": ...} records to analyze")
+    parser.add_argument("--type", dest="download_type", choices=["video", "audio", "cover", "subtitle"])
+    parser.add_argument("--format", help="output format for the chosen type (mp4/mkv, mp3/m4a, webp)")
+    parser.add_argument("--path", dest="download_path")
+    parser.add_argument("--res", dest="video_limit", help="maximum video height, e.g. 1080p")
+    parser.add_argument("--audio-quality", choices=list(AUDIO_QUALITY_MAP.keys()))
+    parser.add_argument("--parallel", dest="parallel_downloads", type=int)
+    parser.add_argument("--limit-rate", dest="bandwidth_limit_kbs", type=int, help="total bandwidth for all parallel downloads in KB/s (0 = unlimited)")
+    parser.add_argument("--fragments", dest="concurrent_fragments", type=int, help="concurrent fragment downloads per HLS/DASH item")
+    parser.add_argument("--limit", type=int, default=0, help="only analyze the first N playlist entries")
+    parser.add_argument("--subs", dest="download_subtitles", action="store_true", default=None)
+    parser.add_argument("--sub-lang", dest="subtitle_language")
+    parser.add_argument("--no-thumbnail", dest="embed_thumbnail", action="store_false", default=None)
+    parser.add_argument("--overwrite", choices=["skip", "replace"], default="skip")
+    parser.add_argument("--order", choices=list(QUEUE_ORDERS), help="download order: as listed, shortest first, largest first or channels interleaved")
+    parser.add_argument("--no-single-pass", dest="single_pass", action="store_false", default=None, help="use yt-dlp's merge/thumbnail/metadata post-processors instead of one ffmpeg mux")
+    parser.add_argument("--no-store", dest="shared_store", action="store_false", default=None, help="don't keep the shared .store folder or link duplicates from it")
+    parser.add_argument("--only-new", action="store_true", help="skip videos already in the download history")
+    parser.add_argument("--force-refresh", action="store_true", help="ignore the metadata cache")
+    parser.add_argument("--sync", action="store_true", help="only queue uploads newer than the newest downloaded video of each URL")
+    parser.add_argument("--every", type=float, metavar="MINUTES", help="with --sync: repeat on this interval until interrupted")
+    parser.add_argument("--resume", action="store_true", help="first finish the unfinished items left in the job queue")
+    parser.add_argument("--json", action="store_true", help="print engine events and results as JSON lines on stdout")
+    parser.add_argument("--metrics", dest="metrics_file", help="append one JSON line of per-item timings, bytes and rate to this file")
+    parser.add_argument("--serve", metavar="[HOST:]PORT", help="don't download: hand the queued items out to --worker processes and record their results here")
+    parser.add_argument("--worker", metavar="URL", help="lease items from a coordinator started with --serve, e.g. http://127.0.0.1:8770")
+    parser.add_argument("--token", default=config.get("coordinator_token", ""), help="shared secret between coordinator and workers")
+    parser.add_argument("--name", help="worker name shown by the coordinator (default: host:pid)")
+    parser.add_argument("--until-drained", action="store_true", help="with --worker: exit once the coordinator has nothing left; with --serve: stop when all items are finished")
+    args = parser.parse_args(argv)
+    if args.saved_urls: args.urls += [url for url in config.get("url_history", []) if url not in args.urls]
+    if args.worker:
+        overrides = {k: v for k, v in vars(args).items() if k in WORKER_LOCAL_OPTIONS and v is not None}
+        try: run_worker(args.worker, overrides, args.token, args.name, args.until_drained)
+        except KeyboardInterrupt: kill_child_processes(); log_message("Worker stopped; its leases go back to the queue when they expire."); return 130
+        return 0
+    if not args.urls and not args.manifest and not args.resume: parser.error("give at least one URL, --saved-urls, --manifest or --resume")
+    if args.every and not args.sync: parser.error("--every needs --sync")
+    if args.serve: return run_coordinator(args)
+
+    options = default_options(**{k: v for k, v in vars(args).items() if k in (
+        "download_type", "download_path", "video_limit", "audio_quality", "parallel_downloads", "bandwidth_limit_kbs", "concurrent_fragments",
+        "download_subtitles", "subtitle_language", "embed_thumbnail", "overwrite", "metrics_file", "shared_store", "order", "single_pass")})
+    if args.format: options[{"video": "video_format", "audio": "audio_format", "cover": "cover_format"}.get(options["download_type"], "video_format")] = args.format
+
+    batches = load_unfinished_jobs() if args.resume else []
+    if batches: log_message(f"Resuming {sum(len(b['jobs']) for b in batches)} unfinished items from the job queue.")
+
+    eta_logged = [time.monotonic()]
+    def on_event(kind, **data):
+        if args.json: sys.stdout.write(json.dumps({"event": kind, **data}, default=str) + "\n"); sys.stdout.flush()
+        elif kind == "log": log_message(data["message"])
+        elif kind == "eta" and time.monotonic() - eta_logged[0] >= 10:
+            eta_logged[0] = time.monotonic(); log_message(format_eta_status(data))
+
+    cancel, results = threading.Event(), []
+    try:
+        while True:
+            if args.sync: jobs = sync_sources(args.urls, args.limit)
+            else: jobs = collect_jobs(args.urls, read_manifest(args.manifest) if args.manifest else [], args.limit, args.force_refresh)
+            if args.only_new:
+                known = get_history_many(job["video_id"] for job in jobs if job["video_id"])
+                jobs = [job for job in jobs if job["video_id"] not in known]
+            if jobs: batches.append({"jobs": enqueue_jobs(jobs, options), "options": options})
+            if not batches: log_message("Nothing to download.")
+            for batch in batches: results += run_jobs(batch["jobs"], batch["options"], on_event=on_event, cancel=cancel)
+            if not args.every: break
+            batches = []
+            log_message(f"Next sync at {datetime.fromtimestamp(time.time() + args.every * 60).strftime('%H:%M')}.")
+            time.sleep(args.every * 60)
+    except KeyboardInterrupt:
+        cancel.set(); kill_child_processes(); log_message("Cancelled. Run again with --resume to continue."); return 130
+    if not results: return 0
+    counts = {status: sum(r["status"] == status for r in results) for status in ("done", "skipped", "failed", "cancelled")}
+    log_message("Summary: " + ", ".join(f"{n} {status}" for status, n in counts.items()))
+    return 1 if counts["failed"] else 0
+
+def run_coordinator(args):
+    host, _, port = args.serve.rpartition(":")
+    options = default_options(**{k: v for k, v in vars(args).items() if k in (
+        "download_type", "download_path", "video_limit", "audio_quality", "bandwidth_limit_kbs", "concurrent_fragments",
+        "download_subtitles", "subtitle_language", "embed_thumbnail", "overwrite", "shared_store", "order", "single_pass")})
+    if args.format: options[{"video": "video_format", "audio": "audio_format", "cover": "cover_format"}.get(options["download_type"], "video_format")] = args.format
+    try: server = start_coordinator(host or config.get("coordinator_host", "127.0.0.1"), int(port), args.token,
+                                    lambda kind, **data: log_message(data["message"]) if kind == "log" else None)
+    except (OSError, ValueError) as e: log_message(f"Could not start the coordinator on {args.serve}: {e}"); return 1
+    jobs = [job for batch in (load_unfinished_jobs() if args.resume else []) for job in batch["jobs"]]
+    if args.urls or args.manifest:
+        found = collect_jobs(args.urls, read_manifest(args.manifest) if args.manifest else [], args.limit, args.force_refresh)
+        if args.only_new:
+            known = get_history_many(job["video_id"] for job in found if job["video_id"])
+            found = [job for job in found if job["video_id"] not in known]
+        if found: jobs += enqueue_jobs(found, options)
+    server.add_jobs(jobs)
+    log_message(f"Serving {len(jobs)} items on http://{server.server_address[0]}:{server.server_address[1]} - start workers with --worker.")
+    try:
+        while True:
+            time.sleep(WORKER_POLL_S)
+            status = server.status()
+            queued = sum(n for state, n in status["states"].items() if state in UNFINISHED_STATES)
+            log_message(f"Coordinator: {queued} unfinished, {len(status['leased'])} leased, {status['states'].get('done', 0)} done, {status['states'].get('failed', 0)} failed.")
+            if args.until_drained and not queued and not status["leased"]:
+                time.sleep(2 * WORKER_POLL_S)  # idle workers poll once more and learn the queue is drained
+                break
+    except KeyboardInterrupt:
+        log_message("Coordinator stopped. Run again with --serve --resume to continue.")
+        return 130
+    finally:
+        server.shutdown()
+    return 1 if status["states"].get("failed") else 0
+
+if __name__ == "__main__":
+    setup_file_log()
+    if len(sys.argv) > 1: sys.exit(run_cli(sys.argv[1:]))
+
+    # --- GUI Layout ---
+    root = tk.Tk()
+    root.title("yt-dlp Downloader GUI v1.4.11x (2026.01.02)")
+    root.geometry("980x920")
+    root.resizable(False, False)
+    root.protocol("WM_DELETE_WINDOW", on_close)
+
+    # URL Input Area
+    url_frame = tk.Frame(root)
+    url_frame.pack(fill="x", padx=10, pady=5)
+    tk.Label(url_frame, text="URL:").pack(side="left")
+
+    url_combo_frame = tk.Frame(url_frame)
+    url_combo_frame.pack(side="left", fill="x", expand=True, padx=(5, 0))
+    url_combo = ttk.Combobox(url_combo_frame, values=[])
+    url_combo.pack(side="left", fill="x", expand=True)
+    update_url_combo_values()
+
+    tk.Button(url_combo_frame, text="+", command=add_url_history, width=3).pack(side="left", padx=(2,0))
+    tk.Button(url_combo_frame, text="-", command=delete_url_history, width=3).pack(side="left", padx=(2,0))
+
+    # Playlist Limit
+    tk.Label(url_frame, text="Limit (0=All):").pack(side="left", padx=(10, 2))
+    playlist_limit_spin = tk.Spinbox(url_frame, from_=0, to=9999, width=5)
+    playlist_limit_spin.delete(0, "end")
+    playlist_limit_spin.insert(0, config.get("playlist_limit", 0))
+    playlist_limit_spin.pack(side="left", padx=(0, 5))
+
+    force_refresh_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(url_frame, text="Force Refresh", variable=force_refresh_var).pack(side="left")
+    tk.Button(url_frame, text="Analyze", command=parse_video, width=10, height=2).pack(side="left", padx=5)
+    tk.Button(url_frame, text="Analyze All", command=parse_saved_urls, width=10, height=2).pack(side="left", padx=5)
+    tk.Button(url_frame, text="Sync", command=sync_saved_urls, width=10, height=2).pack(side="left", padx=5)
+
+    # Settings Area
+    settings_frame = tk.Frame(root)
+    settings_frame.pack(fill="x", padx=10, pady=5)
+    download_type_var = tk.StringVar(value=config.get("download_type", "video"))
+    tk.Label(settings_frame, text="Type:").pack(side="left")
+    tk.Radiobutton(settings_frame, text="Video", variable=download_type_var, value="video", command=update_format_combobox_visibility).pack(side="left", padx=(10, 0))
+    tk.Radiobutton(settings_frame, text="Audio", variable=download_type_var, value="audio", command=update_format_combobox_visibility).pack(side="left", padx=5)
+    tk.Radiobutton(settings_frame, text="Cover", variable=download_type_var, value="cover", command=update_format_combobox_visibility).pack(side="left", padx=5)
+    tk.Radiobutton(settings_frame, text="Subtitle", variable=download_type_var, value="subtitle", command=update_format_combobox_visibility).pack(side="left", padx=5)
+
+    tk.Label(settings_frame, text=" | ").pack(side="left")
+    tk.Label(settings_frame, text="Res:").pack(side="left")
+    video_limit_combo = ttk.Combobox(settings_frame, values=["2160p", "1440p", "1080p", "720p", "480p", "360p", "240p", "144p"], width=7, state="readonly")
+    video_limit_combo.set(config["video_limit"])
+    video_limit_combo.pack(side="left", padx=5)
+    tk.Label(settings_frame, text="Audio:").pack(side="left")
+    audio_quality_combo = ttk.Combobox(settings_frame, values=list(AUDIO_QUALITY_MAP.keys()), width=15, state="readonly")
+    audio_quality_combo.set(config["audio_quality"])
+    audio_quality_combo.pack(side="left", padx=5)
+    video_format_combo = ttk.Combobox(settings_frame, values=["mp4", "mkv"], width=5, state="readonly")
+    video_format_combo.set(config["video_format"])
+    audio_format_combo = ttk.Combobox(settings_frame, values=["mp3", "m4a"], width=5, state="readonly")
+    audio_format_combo.set(config["audio_format"])
+    cover_format_combo = ttk.Combobox(settings_frame, values=["webp"], width=5, state="readonly")
+    cover_format_combo.set("webp")
+
+    path_frame = tk.Frame(root)
+    path_frame.pack(fill="x", padx=10)
+    tk.Label(path_frame, text="Path:").pack(side="left")
+    download_path_entry = tk.Entry(path_frame)
+    download_path_entry.insert(0, config["download_path"])
+    download_path_entry.pack(side="left", fill="x", expand=True)
+    tk.Button(path_frame, text="Browse...", command=select_download_path).pack(side="left", padx=5)
+    tk.Button(path_frame, text="Open", command=open_download_path).pack(side="left", padx=5)
+    tk.Label(path_frame, text="If exists:").pack(side="left", padx=(5, 2))
+    overwrite_combo = ttk.Combobox(path_frame, values=["Ask", "Skip", "Replace"], width=8, state="readonly")
+    overwrite_combo.set(config.get("overwrite_policy", "ask").capitalize())
+    overwrite_combo.pack(side="left")
+    tk.Label(path_frame, text="Order:").pack(side="left", padx=(5, 2))
+    order_combo = ttk.Combobox(path_frame, values=list(QUEUE_ORDERS.values()), width=13, state="readonly")
+    order_combo.set(QUEUE_ORDERS.get(config.get("queue_order"), QUEUE_ORDERS["listed"]))
+    order_combo.pack(side="left")
+
+    options_frame = tk.Frame(root)
+    options_frame.pack(fill="x", padx=10, pady=5, anchor="w")
+    embed_thumbnail_var = tk.BooleanVar(value=config["embed_thumbnail"])
+    tk.Checkbutton(options_frame, text="Embed Thumbnail", variable=embed_thumbnail_var).pack(side="left")
+    add_track_number_var = tk.BooleanVar(value=config.get("add_track_number", True))
+    tk.Checkbutton(options_frame, text="Add Track Num", variable=add_track_number_var).pack(side="left", padx=(10, 0))
+    tk.Label(options_frame, text="Parallel:").pack(side="left", padx=(10, 2))
+    parallel_spin = tk.Spinbox(options_frame, from_=1, to=16, width=3)
+    parallel_spin.delete(0, "end")
+    parallel_spin.insert(0, config.get("parallel_downloads", 3))
+    parallel_spin.pack(side="left")
+    tk.Label(options_frame, text="Max KB/s (0=∞):").pack(side="left", padx=(10, 2))
+    bandwidth_spin = tk.Spinbox(options_frame, from_=0, to=1000000, increment=256, width=7)
+    bandwidth_spin.delete(0, "end")
+    bandwidth_spin.insert(0, config.get("bandwidth_limit_kbs", 0))
+    bandwidth_spin.pack(side="left")
+    tk.Label(options_frame, text="Fragments:").pack(side="left", padx=(10, 2))
+    fragments_spin = tk.Spinbox(options_frame, from_=1, to=16, width=3)
+    fragments_spin.delete(0, "end")
+    fragments_spin.insert(0, config.get("concurrent_fragments", 4))
+    fragments_spin.pack(side="left")
+    tk.Button(options_frame, text="Save Settings", command=save_limit_settings).pack(side="right")
+
+    subtitles_frame = tk.Frame(root)
+    subtitles_frame.pack(fill="x", padx=10, pady=(0,5), anchor="w")
+    download_subtitles_var = tk.BooleanVar(value=config["download_subtitles_enabled"])
+    download_subtitles_check = tk.Checkbutton(subtitles_frame, text="Download Subtitles", variable=download_subtitles_var, state="disabled")
+    download_subtitles_check.pack(side="left")
+    subtitle_lang_combo = ttk.Combobox(subtitles_frame, values=[], width=10, state="disabled")
+    subtitle_lang_combo.set(config["subtitle_language"])
+    subtitle_lang_combo.pack(side="left", padx=5)
+    loading_label = tk.Label(subtitles_frame, text="", width=20, anchor="w")
+    loading_label.pack(side="left", padx=5)
+
+    preview_frame = tk.Frame(root)
+    preview_frame.pack(fill="both", expand=True, padx=10)
+    preview_control_frame = tk.Frame(preview_frame)
+    preview_control_frame.pack(fill="x")
+    tk.Label(preview_control_frame, text="Preview:").pack(side="left", pady=(5,0))
+    tk.Button(preview_control_frame, text="Stats", command=show_stats).pack(side="right", padx=(5, 0), pady=(5,0))
+    tk.Button(preview_control_frame, text="Refresh", command=refresh_history).pack(side="right", padx=(5, 0), pady=(5,0))
+    tk.Button(preview_control_frame, text="Clear", command=deselect_all).pack(side="right", padx=5, pady=(5,0))
+    tk.Button(preview_control_frame, text="Select All", command=select_all).pack(side="right", padx=5, pady=(5,0))
+    tk.Button(preview_control_frame, text="Select New", command=select_undownloaded).pack(side="right", padx=5, pady=(5,0))
+
+    columns = ("check", "url", "title", "duration", "last_download", "progress")
+    preview_table_frame = tk.Frame(preview_frame)
+    preview_table_frame.pack(fill="both", expand=True, pady=5)
+    preview_scrollbar = ttk.Scrollbar(preview_table_frame, orient="vertical", command=scroll_view)
+    preview_scrollbar.pack(side="right", fill="y")
+    preview_tree = ttk.Treeview(preview_table_frame, columns=columns, show="headings", height=15)
+    preview_tree.heading("check", text="✓"); preview_tree.heading("url", text="URL"); preview_tree.heading("title", text="Title", command=lambda: sort_treeview("title")); preview_tree.heading("duration", text="Duration", command=lambda: sort_treeview("duration")); preview_tree.heading("last_download", text="Last DL", command=lambda: sort_treeview("last_download"))
+    preview_tree.column("check", width=30, anchor="center", stretch=False); preview_tree.column("url", width=150, stretch=False); preview_tree.column("title", width=350); preview_tree.column("duration", width=70, anchor="center", stretch=False); preview_tree.column("last_download", width=120, anchor="center", stretch=False)
+    preview_tree.heading("progress", text="Status"); preview_tree.column("progress", width=70, anchor="center", stretch=False)
+    preview_tree.pack(side="left", fill="both", expand=True)
+    preview_tree.bind("<Button-1>", toggle_check)
+    preview_tree.bind("<KeyRelease-space>", toggle_check_with_space)
+    preview_tree.bind("<<TreeviewSelect>>", on_tree_selection_change)
+    preview_tree.bind("<Configure>", on_tree_resize)
+    for wheel_event in ("<MouseWheel>", "<Button-4>", "<Button-5>"): preview_tree.bind(wheel_event, on_mouse_wheel)
+    preview_tree.bind("<Prior>", lambda event: scroll_view("scroll", -1, "pages")); preview_tree.bind("<Next>", lambda event: scroll_view("scroll", 1, "pages"))
+
+    progress_frame = tk.Frame(root)
+    progress_frame.pack(fill="x", padx=10, pady=5)
+    progress_var = tk.DoubleVar()
+    progress_bar = ttk.Progressbar(progress_frame, variable=progress_var, maximum=100)
+    progress_bar.pack(side="left", fill="x", expand=True)
+    eta_var = tk.StringVar()
+    tk.Label(progress_frame, textvariable=eta_var, width=28, anchor="e").pack(side="left", padx=(5, 0))
+    download_btn = tk.Button(progress_frame, text="Download", command=start_download_thread, width=10, height=2)
+    download_btn.pack(side="left", padx=(5, 0))
+    cancel_btn = tk.Button(progress_frame, text="Cancel", command=cancel_download, width=10, height=2, state="disabled")
+    cancel_btn.pack(side="left", padx=(5, 0))
+    tk.Button(progress_frame, text="Serve", command=serve_to_workers, width=10, height=2).pack(side="left", padx=(5, 0))
+    log_frame = tk.Frame(root)
+    log_frame.pack(fill="both", expand=True, padx=10, pady=5)
+    tk.Label(log_frame, text="Log:").pack(anchor="w")
+    log_text = tk.Text(log_frame, height=8)
+    log_text.pack(fill="both", expand=True, pady=5)
+    log_text.config(state="normal")
+
+    update_format_combobox_visibility()
+    root.after(UI_FRAME_MS, drain_ui_events)
+    root.after_idle(report_startup)
+    root.after(200, offer_resume)
+    schedule_sync()
+
+    root.mainloop()
\ No newline at end of file